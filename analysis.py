@@ -0,0 +1,154 @@
+import multiprocessing
+import queue
+
+import othello_logic
+from bitboard import legalMoves, flips, squares
+from computer_player import ComputerPlayer, SearchStopped
+from evaluation import Evaluator
+from symmetry import canonical
+
+
+def _children(mover, opponent):
+    """(square, key) for every legal move, `key` the canonical form of the position it leads to"""
+    children = []
+    for square in squares(legalMoves(mover, opponent)):
+        flipped = flips(mover, opponent, square)
+        child = canonical(opponent & ~flipped, mover | flipped | (1 << square))
+        children.append((square, child[:2]))
+    return children
+
+
+def _analyseWorker(requests, results, generation, evaluator, maxDepth):
+    """Analysis process: deepen on each requested position until it is done or a newer one arrives
+
+    Requests are (tag, mover, opponent) or None to exit; a request whose tag
+    is no longer `generation.value` is stale and skipped. Every move searched
+    is sent back as a cache entry (key, depth, score), the score for the
+    side to move after the move.
+    """
+    engine = ComputerPlayer(evaluator=evaluator)
+    cache = {}
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        tag, mover, opponent = request
+        if tag != generation.value:
+            continue
+        engine.stopCheck = lambda: generation.value != tag
+        empties = 64 - (mover | opponent).bit_count()
+        children = _children(mover, opponent)
+        try:
+            # at depth empties + 1 every line reaches the end of the game and the scores are exact
+            for depth in range(1, min(maxDepth, empties + 1) + 1):
+                if engine.stopCheck():
+                    break
+                engine.newSearch()
+                for square, key in children:
+                    if cache.get(key, (-1, 0))[0] >= depth - 1:
+                        continue
+                    flipped = flips(mover, opponent, square)
+                    score = engine.pvs(opponent & ~flipped, mover | flipped | (1 << square), depth - 1,
+                                       -engine.maxScore, engine.maxScore)
+                    cache[key] = (depth - 1, score)
+                    results.put((key, depth - 1, score))
+        except SearchStopped:
+            pass
+
+
+class MoveAnalyser:
+    """Scores every legal move of the position on screen, searched deeper and deeper in another process
+
+    # HOW IT WORKS:
+    # A worker process searches each move of the requested position with a
+    # full window, depth 1, 2, 3... so every move gets a true score rather
+    # than just a bound, and sends each result back as soon as it has it.
+    # Running in its own process the search never holds up the frame loop;
+    # `poll` (once a frame) only empties the result queue.
+    # Results are kept in `cache` by the canonical position a move leads
+    # to, in both processes. Asking for a position again, after a takeback
+    # or when analysis is switched back on, shows the cached scores at
+    # once and the worker carries on from the depth already reached.
+    # A new position (or `pause`) bumps the shared `generation` counter;
+    # the worker's search checks it every few thousand nodes and drops
+    # the stale position.
+    #
+    # WHAT IT HOLDS:
+    # scores: {(row, col): (score for the side to move, depth)} for the
+    #   position last passed to `analyse`
+    # moves: {canonical child position: [(row, col), ...]} for that position;
+    #   symmetric moves lead to the same canonical position and share a score
+    # cache: {canonical child position: (depth, score for the side to move there)}
+    """
+
+    def __init__(self, maxDepth=20, evaluator=None):
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+        self.generation = multiprocessing.Value('q', 0, lock=False)
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_analyseWorker, args=(self.requests, self.results, self.generation, self.evaluator, maxDepth),
+            daemon=True)
+        self.process.start()
+        self.cache = {}
+        self.position = None
+        self.moves = {}
+        self.scores = {}
+
+    def analyse(self, grid, player):
+        """Show and refine the scores of `player`'s moves in `grid`; cheap when the position has not changed"""
+        mover, opponent = othello_logic.gridMasks(grid, player)
+        if (mover, opponent) == self.position:
+            return
+        self.position = mover, opponent
+        self.moves = {}
+        self.scores = {}
+        for square, key in _children(mover, opponent):
+            move = divmod(square, 8)
+            self.moves.setdefault(key, []).append(move)
+            if key in self.cache:
+                depth, score = self.cache[key]
+                self.scores[move] = (-score, depth + 1)
+        self.generation.value += 1
+        self.requests.put((self.generation.value, mover, opponent))
+
+    def pause(self):
+        """Stop searching; the cache is kept"""
+        if self.position is not None:
+            self.position = None
+            self.moves = {}
+            self.scores = {}
+            self.generation.value += 1
+
+    def poll(self):
+        """Take in the results that have arrived, without waiting"""
+        while True:
+            try:
+                key, depth, score = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if self.cache.get(key, (-1, 0))[0] >= depth:
+                continue
+            self.cache[key] = (depth, score)
+            # results for an earlier position still count when one of its moves reaches the same position
+            for move in self.moves.get(key, ()):
+                self.scores[move] = (-score, depth + 1)
+
+    def label(self, score):
+        """Short text for a score: evaluation units, or W or L and the final disc margin once the game is solved"""
+        limit = self.evaluator.maxScore
+        if score > limit:
+            return f'W{score - limit}'
+        if score < -limit:
+            return f'L{-score - limit}'
+        return f'{score:+d}'
+
+    def close(self):
+        self.generation.value += 1
+        self.requests.put(None)
+        self.process.join(1.0)
+        if self.process.is_alive():
+            # forked after pygame.init(), the worker ignores SIGTERM; SIGKILL cannot be ignored, and
+            # joining it keeps multiprocessing's exit handler from waiting on it forever
+            self.process.kill()
+            self.process.join()
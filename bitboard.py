@@ -0,0 +1,84 @@
+# ===== BITBOARDS =====
+#
+# A side's discs as one 64 bit int, bit (row * 8 + col). Working on whole
+# boards with shifts and masks is much faster in Python than walking the
+# list-of-lists grid cell by cell, so the engines use these for their inner
+# loops. Convert with othello_logic.gridMasks(grid, player).
+
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_COL_A = 0xFEFEFEFEFEFEFEFE
+NOT_COL_H = 0x7F7F7F7F7F7F7F7F
+INNER_COLUMNS = 0x7E7E7E7E7E7E7E7E
+
+# (shift, mask applied after shifting): a positive shift moves towards h8
+DIRECTIONS = (
+    (1, NOT_COL_A), (-1, NOT_COL_H),
+    (8, FULL), (-8, FULL),
+    (9, NOT_COL_A), (7, NOT_COL_H),
+    (-7, NOT_COL_A), (-9, NOT_COL_H),
+)
+
+
+def legalMoves(mover, opponent):
+    """Bitmask of every square where `mover` may play
+
+    # HOW IT WORKS:
+    # For each of the 8 directions, start from our discs, step onto runs of
+    # opponent discs (at most 6 long) and the empty square just past a run is
+    # a legal move. Directions are written out one by one because a loop
+    # over them costs noticeably more in Python. The opponent mask used for
+    # sideways directions leaves out columns a and h, which also stops a
+    # run wrapping round from one row to the next.
+    """
+    empty = ~(mover | opponent) & FULL
+    inner = opponent & INNER_COLUMNS
+    x = inner & (mover << 1); x |= inner & (x << 1); x |= inner & (x << 1); x |= inner & (x << 1); x |= inner & (x << 1); x |= inner & (x << 1)
+    moves = x << 1
+    x = inner & (mover >> 1); x |= inner & (x >> 1); x |= inner & (x >> 1); x |= inner & (x >> 1); x |= inner & (x >> 1); x |= inner & (x >> 1)
+    moves |= x >> 1
+    x = opponent & (mover << 8); x |= opponent & (x << 8); x |= opponent & (x << 8); x |= opponent & (x << 8); x |= opponent & (x << 8); x |= opponent & (x << 8)
+    moves |= x << 8
+    x = opponent & (mover >> 8); x |= opponent & (x >> 8); x |= opponent & (x >> 8); x |= opponent & (x >> 8); x |= opponent & (x >> 8); x |= opponent & (x >> 8)
+    moves |= x >> 8
+    x = inner & (mover << 9); x |= inner & (x << 9); x |= inner & (x << 9); x |= inner & (x << 9); x |= inner & (x << 9); x |= inner & (x << 9)
+    moves |= x << 9
+    x = inner & (mover >> 9); x |= inner & (x >> 9); x |= inner & (x >> 9); x |= inner & (x >> 9); x |= inner & (x >> 9); x |= inner & (x >> 9)
+    moves |= x >> 9
+    x = inner & (mover << 7); x |= inner & (x << 7); x |= inner & (x << 7); x |= inner & (x << 7); x |= inner & (x << 7); x |= inner & (x << 7)
+    moves |= x << 7
+    x = inner & (mover >> 7); x |= inner & (x >> 7); x |= inner & (x >> 7); x |= inner & (x >> 7); x |= inner & (x >> 7); x |= inner & (x >> 7)
+    moves |= x >> 7
+    return moves & empty
+
+
+def flips(mover, opponent, square):
+    """Bitmask of the opponent discs flipped when `mover` plays `square`"""
+    flipped = 0
+    start = 1 << square
+    for shift, mask in DIRECTIONS:
+        line = 0
+        if shift > 0:
+            cell = (start << shift) & mask
+            while cell & opponent:
+                line |= cell
+                cell = (cell << shift) & mask
+        else:
+            cell = (start >> -shift) & mask
+            while cell & opponent:
+                line |= cell
+                cell = (cell >> -shift) & mask
+        if cell & mover:
+            flipped |= line
+    return flipped & FULL
+
+
+def squares(mask):
+    """Yield the square index of every set bit, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def popcount(mask):
+    return mask.bit_count()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import othello_logic
+from computer_player import ComputerPlayer
+from game_record import moveToText
+
+_engine = None
+
+
+def analysePosition(position, depth=None, budget=None):
+    """Search one position given as text, return (position, best_move, score, nodes, time)
+
+    With `depth` the search is a single fixed depth computerHard, otherwise
+    iterative deepening within `budget` seconds. The score is for the side
+    to move, in Evaluator units; beyond +-maxScore it is a solved result of
+    maxScore plus the final disc difference.
+    """
+    global _engine
+    if _engine is None:
+        _engine = ComputerPlayer()
+    grid, player = othello_logic.textToPosition(position)
+    start = time.perf_counter()
+    if depth is not None:
+        _engine.nodes = 0
+        move, score = _engine.computerHard(grid, depth, None, None, player)
+        nodes = _engine.nodes
+    else:
+        move, score, _, nodes = _engine.computerTimed(grid, player, budget if budget is not None else 1.0)
+    return position, move, score * -player, nodes, time.perf_counter() - start
+
+
+def analysePositions(positions, depth=None, budget=None, workers=None, window=None):
+    """Search every position from an iterable on a process pool, yielding results as they finish
+
+    # HOW IT WORKS:
+    # Positions are pulled from the iterable only while fewer than `window`
+    # searches are in flight (default four per worker), so memory stays
+    # bounded however long the input is, and every worker always has work
+    # queued. Results come back in completion order, not input order.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * 4
+    positions = iter(positions)
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                position = next(positions, None)
+                if position is None:
+                    exhausted = True
+                    break
+                position = position.strip()
+                if position:
+                    pending.add(pool.submit(analysePosition, position, depth, budget))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def readPositions(path):
+    with open(path) as file:
+        for line in file:
+            if line.strip() and not line.startswith('#'):
+                yield line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analyse a file of positions (one "<64 cells> <W|B>" per line)')
+    parser.add_argument('positions')
+    parser.add_argument('--depth', type=int, help='fixed search depth per position')
+    parser.add_argument('--time', type=float, default=1000, help='time per position in ms (when no depth is given)')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    count = totalNodes = 0
+    for position, move, score, nodes, seconds in analysePositions(
+            readPositions(args.positions), args.depth, args.time / 1000, args.workers):
+        print(f'{position}\t{moveToText(move)}\t{score}\t{nodes}\t{seconds * 1000:.1f}', flush=True)
+        count += 1
+        totalNodes += nodes
+    elapsed = time.perf_counter() - start
+    print(f'# {count} positions, {totalNodes} nodes in {elapsed:.2f}s ({count / elapsed:.1f} positions/s)')
@@ -0,0 +1,303 @@
+import time
+
+import othello_logic
+from bitboard import legalMoves, flips, squares
+from evaluation import Evaluator
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
+
+# Static move ordering: corners first, squares next to empty corners last
+SQUARE_WEIGHTS = [
+    100, -20, 10, 5, 5, 10, -20, 100,
+    -20, -50, -2, -2, -2, -2, -50, -20,
+    10, -2, -1, -1, -1, -1, -2, 10,
+    5, -2, -1, 0, 0, -1, -2, 5,
+    5, -2, -1, 0, 0, -1, -2, 5,
+    10, -2, -1, -1, -1, -1, -2, 10,
+    -20, -50, -2, -2, -2, -2, -50, -20,
+    100, -20, 10, 5, 5, 10, -20, 100,
+]
+
+
+# nodeLimit when the search is not limited by nodes
+NO_LIMIT = 1 << 62
+# nodes searched between two looks at `stopped` and `stopCheck`
+CHECK_INTERVAL = 1024
+
+
+class SearchStopped(Exception):
+    """Raised inside the search when it is cancelled or nodeLimit is reached, unwinds the whole search"""
+
+
+class ComputerPlayer:
+    """Principal variation search for the computer side
+
+    `gridObject` only needs `swappableTiles` and `findAvailMoves`; the game
+    passes its Grid, headless tools can leave it out and the rules in
+    othello_logic are used directly.
+
+    computerHard/computerTimed take and return scores from black's (-1)
+    point of view, black maximises and white minimises. Inside the search
+    everything is negamax: scores are for the side to move.
+
+    `evaluator` is any object with `evaluate(mover, opponent)` on bitboards
+    and `maxScore`, the largest value it can return (see evaluation.py).
+    Finished games score beyond every evaluation and the search bounds are
+    derived from that, so any evaluator can be plugged in.
+
+    `table` is the TranspositionTable the search reads and fills; it keys
+    positions by their canonical form, so mirrored positions share entries.
+
+    One ComputerPlayer is meant to live for the whole session: the table
+    and the move ordering scores carry over from move to move and game to
+    game, and are aged rather than thrown away when a new search starts
+    (see newSearch). `reset` forgets everything.
+    """
+
+    def __init__(self, gridObject=None, evaluator=None, table=None):
+        self.grid = gridObject if gridObject is not None else othello_logic
+        self.nodes = 0
+        self.nodeLimit = NO_LIMIT
+        self.checkAt = CHECK_INTERVAL
+        self.stopped = False
+        self.stopCheck = None
+        self.deadline = None
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+        self.evaluate = self.evaluator.evaluate
+        self.maxScore = self.evaluator.maxScore + 64
+        self.aspiration = max(1, self.evaluator.maxScore // 32)
+        self.table = table if table is not None else TranspositionTable()
+        self.moveOrder = list(SQUARE_WEIGHTS)
+
+    def searchFunction(self, depth, move, newGrid, player, alpha, beta):
+        X, Y = move
+        swappableTiles = self.grid.swappableTiles(X, Y, newGrid, player)
+        newGrid[X][Y] = player
+        for tile in swappableTiles:
+            newGrid[tile[0]][tile[1]] = player
+        bestMove, value = self.computerHard(newGrid, depth-1, alpha, beta, player * -1)
+        return bestMove, value
+
+    def finalScore(self, mover, opponent):
+        """Score of a finished game: the disc difference pushed past every evaluation of an unfinished one"""
+        difference = mover.bit_count() - opponent.bit_count()
+        if difference > 0:
+            return difference + self.evaluator.maxScore
+        if difference < 0:
+            return difference - self.evaluator.maxScore
+        return 0
+
+    def newSearch(self):
+        """Called before every search: start a new table generation and fade the history scores
+
+        # HOW IT WORKS:
+        # moveOrder starts as SQUARE_WEIGHTS. Every move that causes a
+        # cut-off gets depth * depth added (the history heuristic), so moves
+        # that were good elsewhere in the tree are tried early. Between
+        # searches the learned part is halved, so old games and positions
+        # gradually stop counting.
+        """
+        self.table.newGeneration()
+        self.checkAt = min(self.nodeLimit, self.nodes + CHECK_INTERVAL)
+        moveOrder = self.moveOrder
+        for square, weight in enumerate(SQUARE_WEIGHTS):
+            moveOrder[square] = weight + (moveOrder[square] - weight) // 2
+
+    def checkStop(self):
+        """Called every CHECK_INTERVAL nodes and at nodeLimit: raise SearchStopped if the search has to end
+
+        # HOW IT WORKS:
+        # Cancelling is cooperative. Another thread sets `stopped`, or
+        # `stopCheck` (any callable, e.g. a multiprocessing.Event's is_set
+        # shared with worker processes) starts returning True, or the
+        # `deadline` (perf_counter time) passes, and the search notices
+        # within CHECK_INTERVAL nodes. Between checks each node only
+        # compares its counter with `checkAt`.
+        """
+        if self.stopped or self.nodes >= self.nodeLimit or (self.stopCheck is not None and self.stopCheck()) \
+                or (self.deadline is not None and time.perf_counter() >= self.deadline):
+            raise SearchStopped()
+        self.checkAt = min(self.nodeLimit, self.nodes + CHECK_INTERVAL)
+
+    def reset(self):
+        self.table.clear()
+        self.moveOrder = list(SQUARE_WEIGHTS)
+
+    def pvs(self, mover, opponent, depth, alpha, beta):
+        """Negamax principal variation search, fail-soft
+
+        # HOW IT WORKS:
+        # The first move (the expected best after ordering) is searched with
+        # the full window. Every other move is only tested with a null window
+        # (alpha, alpha + 1), which is much cheaper and just answers "is this
+        # better than what we have?". Only when the answer is yes is the move
+        # searched again with the real window.
+        # Every result is stored in the transposition table with whether it
+        # is exact or only a bound; a later visit to the same position (or a
+        # mirror image of it) at no greater depth can return straight away,
+        # and otherwise still tries the stored best move first.
+        """
+        if self.nodes >= self.checkAt:
+            self.checkStop()
+        self.nodes += 1
+        if depth == 0:
+            return self.evaluate(mover, opponent)
+        moves = legalMoves(mover, opponent)
+        if not moves:
+            if not legalMoves(opponent, mover):
+                return self.finalScore(mover, opponent)
+            return -self.pvs(opponent, mover, depth, -beta, -alpha)
+        table = self.table
+        key, t = table.key(mover, opponent)
+        entry = table.probe(key, t)
+        order = sorted(squares(moves), key=self.moveOrder.__getitem__, reverse=True)
+        if entry is not None:
+            entryDepth, flag, score, hashMove = entry
+            if entryDepth >= depth and (flag == EXACT or (flag == LOWER and score >= beta)
+                                        or (flag == UPPER and score <= alpha)):
+                return score
+            if hashMove != NO_MOVE:
+                order.remove(hashMove)
+                order.insert(0, hashMove)
+        alphaOrig = alpha
+        best, bestSquare = -self.maxScore - 1, None
+        first = True
+        for square in order:
+            flipped = flips(mover, opponent, square)
+            newMover, newOpponent = opponent & ~flipped, mover | flipped | (1 << square)
+            if first:
+                score = -self.pvs(newMover, newOpponent, depth - 1, -beta, -alpha)
+                first = False
+            else:
+                score = -self.pvs(newMover, newOpponent, depth - 1, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self.pvs(newMover, newOpponent, depth - 1, -beta, -score)
+            if score > best:
+                best, bestSquare = score, square
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.moveOrder[square] += depth * depth
+                        break
+        flag = UPPER if best <= alphaOrig else LOWER if best >= beta else EXACT
+        table.store(key, t, depth, flag, best, bestSquare)
+        return best
+
+    def searchRoot(self, mover, opponent, depth, alpha, beta, firstMove=None):
+        """Like pvs but also returns the best square; `firstMove` is searched first"""
+        moves = legalMoves(mover, opponent)
+        if depth == 0 or not moves:
+            return None, self.pvs(mover, opponent, depth, alpha, beta)
+        if self.nodes >= self.checkAt:
+            self.checkStop()
+        self.nodes += 1
+        order = sorted(squares(moves), key=self.moveOrder.__getitem__, reverse=True)
+        if firstMove in order:
+            order.remove(firstMove)
+            order.insert(0, firstMove)
+        bestMove, best = None, -self.maxScore - 1
+        for square in order:
+            flipped = flips(mover, opponent, square)
+            newMover, newOpponent = opponent & ~flipped, mover | flipped | (1 << square)
+            if bestMove is None:
+                score = -self.pvs(newMover, newOpponent, depth - 1, -beta, -alpha)
+            else:
+                score = -self.pvs(newMover, newOpponent, depth - 1, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = -self.pvs(newMover, newOpponent, depth - 1, -beta, -score)
+            if bestMove is None or score > best:
+                bestMove, best = square, score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return bestMove, best
+
+    def computerHard(self, grid, depth, alpha=None, beta=None, player=-1):
+        """Search `grid` to `depth` for `player`, return ((row, col) or None, score for black)
+
+        `alpha`/`beta` are black's bounds; None means the evaluator's full range.
+        """
+        if alpha is None:
+            alpha = -self.maxScore
+        if beta is None:
+            beta = self.maxScore
+        if player > 0:
+            alpha, beta = -beta, -alpha
+        mover, opponent = othello_logic.gridMasks(grid, player)
+        self.newSearch()
+        square, score = self.searchRoot(mover, opponent, depth, alpha, beta)
+        return (divmod(square, 8) if square is not None else None), score * -player
+
+    def aspirationSearch(self, mover, opponent, depth, guess, firstMove):
+        """Search with a narrow window around `guess`, widening it only if the score falls outside"""
+        full = self.maxScore
+        delta = self.aspiration
+        alpha, beta = max(-full, guess - delta), min(full, guess + delta)
+        while True:
+            square, score = self.searchRoot(mover, opponent, depth, alpha, beta, firstMove)
+            if score <= alpha and alpha > -full:
+                delta *= 4
+                alpha = max(-full, score - delta)
+            elif score >= beta and beta < full:
+                delta *= 4
+                beta = min(full, score + delta)
+            else:
+                return square, score
+
+    def computerTimed(self, grid, player, budget, maxDepth=60, callback=None, nodeLimit=None):
+        """Iterative deepening within a time budget (seconds) and/or a node budget
+
+        # HOW IT WORKS:
+        # Searches depth 1, 2, 3... Each depth starts from the previous best
+        # move and an aspiration window around the previous score. Each depth
+        # costs a few times the one before it, so a new depth is only started
+        # if it is expected to finish inside the budget, and a depth still
+        # running when the budget is spent is abandoned. Setting `stopped`
+        # from another thread also abandons the depth in progress; either
+        # way the last finished depth is kept.
+        # With `nodeLimit` the search also stops on exactly that many nodes
+        # and keeps the last depth finished before it. A search limited only
+        # by nodes (budget None) does not look at the clock at all, so it
+        # gives the same move on any machine.
+        # `callback(depth, move, score, nodes, elapsed)` is called after each depth.
+        # Returns (move, score, depth, nodes) with the score for black.
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self.nodeLimit = nodeLimit if nodeLimit is not None else NO_LIMIT
+        self.deadline = start + budget if budget is not None else None
+        self.stopped = False
+        mover, opponent = othello_logic.gridMasks(grid, player)
+        self.newSearch()
+        square, score, depth = None, 0, 0
+        lastTime = 0
+        while depth < maxDepth:
+            elapsed = time.perf_counter() - start
+            if depth > 0 and budget is not None and elapsed + lastTime * 4 > budget:
+                break
+            depthStart = time.perf_counter()
+            try:
+                if depth == 0:
+                    bestSquare, value = self.searchRoot(mover, opponent, 1, -self.maxScore, self.maxScore)
+                else:
+                    bestSquare, value = self.aspirationSearch(mover, opponent, depth + 1, score, square)
+            except SearchStopped:
+                break
+            lastTime = time.perf_counter() - depthStart
+            if bestSquare is None:
+                break
+            depth += 1
+            square, score = bestSquare, value
+            if callback is not None:
+                callback(depth, divmod(square, 8), score * -player, self.nodes, time.perf_counter() - start)
+        if square is None:
+            moves = legalMoves(mover, opponent)
+            if moves:
+                square = next(squares(moves))
+        self.nodeLimit = NO_LIMIT
+        self.deadline = None
+        move = divmod(square, 8) if square is not None else None
+        return move, score * -player, depth, self.nodes
+
+    def evaluateBoard(self, grid, player):
+        return self.evaluate(*othello_logic.gridMasks(grid, player))
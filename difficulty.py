@@ -0,0 +1,140 @@
+import time
+
+import othello_logic
+from computer_player import ComputerPlayer
+from evaluation import Evaluator, NoisyEvaluator
+
+
+class Profile:
+    """One difficulty level
+
+    # WHAT IT HOLDS:
+    # nodes: node budget per move (None = unlimited)
+    # budget: time budget per move in seconds (None = no clock)
+    # noise: largest error added to each evaluation, in evaluation units
+    # maxDepth: deepest iteration the search may start
+    # A profile without a time budget is reproducible: the same position
+    # and seed give the same move on any machine.
+    """
+
+    __slots__ = ('name', 'nodes', 'budget', 'noise', 'maxDepth')
+
+    def __init__(self, name, nodes=None, budget=None, noise=0, maxDepth=60):
+        self.name = name
+        self.nodes = nodes
+        self.budget = budget
+        self.noise = noise
+        self.maxDepth = maxDepth
+
+    @property
+    def reproducible(self):
+        return self.budget is None
+
+
+# From weakest to strongest. The search runs at roughly 35k nodes per
+# second, so beginner and casual cost a few milliseconds of CPU per move,
+# club about 0.15 s and strong under a second.
+PROFILES = {
+    'beginner': Profile('beginner', nodes=60, noise=200, maxDepth=2),
+    'casual': Profile('casual', nodes=600, noise=80, maxDepth=3),
+    'club': Profile('club', nodes=6000, noise=20),
+    'strong': Profile('strong', nodes=25000),
+    'expert': Profile('expert', budget=2.0),
+}
+DEFAULT_LEVEL = 'club'
+
+
+class LevelPlayer:
+    """ComputerPlayer limited by a difficulty profile, a drop-in for the game like MCTSPlayer
+
+    # HOW IT WORKS:
+    # The search is the normal iterative deepening, stopped by the node
+    # budget (counted exactly, no clock involved) or the time budget
+    # (`budget`, which a game clock may change move by move), keeping the
+    # last depth that finished. Weaker levels also search with a
+    # NoisyEvaluator seeded with `seed`. With `reproducible` and no time
+    # budget the engine's table and move ordering are reset before every
+    # move, so the move depends only on the position, the profile and the
+    # seed, never on earlier games; tools comparing runs need that. The
+    # game passes reproducible=False and keeps what the table learnt from
+    # one move to the next, as the plain engine does.
+    # computerHard ignores depth, alpha and beta and returns (move, score)
+    # with the score for black.
+    """
+
+    def __init__(self, profile=DEFAULT_LEVEL, gridObject=None, seed=0, reproducible=True):
+        if isinstance(profile, str):
+            profile = PROFILES[profile]
+        self.profile = profile
+        self.seed = seed
+        self.reproducible = reproducible
+        evaluator = Evaluator()
+        if profile.noise:
+            evaluator = NoisyEvaluator(evaluator, profile.noise, seed)
+        self.engine = ComputerPlayer(gridObject, evaluator)
+        # seconds per move; starts as the profile's, a game clock sets it before each move
+        self.budget = profile.budget
+        # nodes and depth of the last search
+        self.nodes = 0
+        self.depth = 0
+
+    @property
+    def stopped(self):
+        return self.engine.stopped
+
+    @stopped.setter
+    def stopped(self, value):
+        # lets the game cancel a search running on another thread, as with ComputerPlayer
+        self.engine.stopped = value
+
+    def search(self, grid, player):
+        """Return (move, score for black, depth, nodes)"""
+        profile = self.profile
+        if self.reproducible and self.budget is None:
+            self.engine.reset()
+        result = self.engine.computerTimed(grid, player, self.budget, profile.maxDepth, nodeLimit=profile.nodes)
+        self.depth, self.nodes = result[2:]
+        return result
+
+    def computerHard(self, grid, depth, alpha, beta, player):
+        move, score, _, _ = self.search(grid, player)
+        return move, score
+
+    def evaluateBoard(self, grid, player):
+        return self.engine.evaluateBoard(grid, player)
+
+
+def levelReport(positions=30, seed=0):
+    """Search sample positions at every level, return {name: (mean nodes, mean ms, moves)}
+
+    `moves` is the list of chosen moves, so two runs (or two machines) can
+    be compared for identical play.
+    """
+    samples = othello_logic.randomPositions(positions, 20, seed)
+    report = {}
+    for name, profile in PROFILES.items():
+        player = LevelPlayer(profile, seed=seed)
+        nodes = 0
+        moves = []
+        start = time.perf_counter()
+        for grid, side in samples:
+            move, _, _, searched = player.search(grid, side)
+            nodes += searched
+            moves.append(move)
+        elapsed = time.perf_counter() - start
+        report[name] = (nodes / len(samples), elapsed * 1000 / len(samples), moves)
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Cost and reproducibility of each difficulty level')
+    parser.add_argument('--positions', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    first = levelReport(args.positions, args.seed)
+    second = levelReport(args.positions, args.seed)
+    for name, (nodes, ms, moves) in first.items():
+        same = 'same moves' if moves == second[name][2] else 'DIFFERENT moves'
+        print(f'{name:9} {nodes:9.0f} nodes/move {ms:8.2f} ms/move  repeat run: {same}')
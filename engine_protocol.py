@@ -0,0 +1,156 @@
+import sys
+import threading
+
+import othello_logic
+from computer_player import ComputerPlayer
+from game_record import moveToText, textToMove, textToMoves
+
+# ===== ENGINE PROTOCOL =====
+#
+# Text protocol on stdin/stdout so test harnesses and tournament managers can
+# drive the engine without a window. One command per line:
+#
+#   name / version            -> = Othello / = <version>
+#   isready                   -> readyok
+#   newgame                   start position, white to move (as in the game)
+#   setboard <64 cells> <W|B> cells are W, B or . row by row from a1 to h8
+#   moves f5d6c3              play moves on the current board ('--' = pass)
+#   play f5                   play one move
+#   board                     -> board <64 cells> <W|B> <legal moves or ->
+#   go depth N | go time MS   search; prints info lines then 'bestmove f5'
+#   stop                      finish the running search now
+#   quit
+#
+# While searching, one line per finished depth is printed:
+#   info depth 4 score 2 nodes 1234 nps 5678 time 217 pv f5
+# Scores are for the side to move, in the evaluation units of
+# evaluation.Evaluator. A line searched to the end of the game scores
+# maxScore plus the final disc difference (minus that for a loss), so any
+# score beyond +-maxScore is an exact result. Errors are '? message'.
+
+VERSION = '1.0'
+
+
+class EngineProtocol:
+    """Reads commands, keeps the current position and runs searches on a background thread"""
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.lock = threading.Lock()
+        self.engine = ComputerPlayer()
+        self.searchThread = None
+        # set to stop the running search; a new Event per search, so a stop
+        # sent before the search thread gets going is never lost, and a
+        # timer left over from an earlier search cannot stop this one
+        self.stopEvent = threading.Event()
+        self.newGame()
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def newGame(self):
+        self.grid = othello_logic.startGrid()
+        self.player = 1
+
+    def setBoard(self, cells, side):
+        self.grid, self.player = othello_logic.textToPosition(f'{cells} {side}')
+
+    def play(self, move):
+        if move is None:
+            if othello_logic.findAvailMoves(self.grid, self.player):
+                raise ValueError('pass not allowed')
+        elif move not in othello_logic.findAvailMoves(self.grid, self.player):
+            raise ValueError(f'illegal move {moveToText(move)}')
+        else:
+            othello_logic.applyMove(self.grid, move, self.player)
+        self.player *= -1
+
+    def boardText(self):
+        moves = ''.join(moveToText(move) for move in othello_logic.findAvailMoves(self.grid, self.player)) or '-'
+        return f'board {othello_logic.positionToText(self.grid, self.player)} {moves}'
+
+    def info(self, depth, move, score, nodes, elapsed):
+        nps = int(nodes / elapsed) if elapsed > 0 else 0
+        self.send(f'info depth {depth} score {score * -self.searchPlayer} nodes {nodes} nps {nps} '
+                  f'time {int(elapsed * 1000)} pv {moveToText(move)}')
+
+    def search(self, grid, budget, maxDepth):
+        move, score, depth, nodes = self.engine.computerTimed(grid, self.searchPlayer, budget, maxDepth, self.info)
+        self.send(f'bestmove {moveToText(move)}')
+
+    def go(self, args):
+        self.stop()
+        maxDepth, budget = 60, float('inf')
+        if len(args) == 2 and args[0] == 'depth':
+            maxDepth = int(args[1])
+        elif len(args) == 2 and args[0] == 'time':
+            budget = int(args[1]) / 1000
+        elif args:
+            raise ValueError('usage: go depth N | go time MS')
+        self.searchPlayer = self.player
+        self.stopEvent = threading.Event()
+        self.engine.stopCheck = self.stopEvent.is_set
+        grid = [row[:] for row in self.grid]
+        self.searchThread = threading.Thread(target=self.search, args=(grid, budget, maxDepth), daemon=True)
+        self.searchThread.start()
+        if budget != float('inf'):
+            timer = threading.Timer(budget, self.stopEvent.set)
+            timer.daemon = True
+            timer.start()
+
+    def stop(self):
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    def command(self, line):
+        """Handle one command line, return False when the driver should exit"""
+        parts = line.split()
+        if not parts:
+            return True
+        name, args = parts[0].lower(), parts[1:]
+        try:
+            if name == 'quit':
+                self.stop()
+                return False
+            elif name == 'name':
+                self.send('= Othello')
+            elif name == 'version':
+                self.send(f'= {VERSION}')
+            elif name == 'isready':
+                self.send('readyok')
+            elif name == 'stop':
+                self.stop()
+            elif name == 'go':
+                self.go(args)
+            else:
+                self.stop()
+                if name == 'newgame':
+                    self.newGame()
+                elif name == 'setboard' and len(args) == 2:
+                    self.setBoard(*args)
+                elif name == 'moves' and len(args) == 1:
+                    for move in textToMoves(args[0]):
+                        self.play(move)
+                elif name == 'play' and len(args) == 1:
+                    self.play(textToMove(args[0]))
+                elif name == 'board':
+                    self.send(self.boardText())
+                else:
+                    self.send(f'? unknown command {line.strip()}')
+        except ValueError as error:
+            self.send(f'? {error}')
+        return True
+
+    def run(self, input=sys.stdin):
+        for line in input:
+            if not self.command(line):
+                break
+        self.stop()
+
+
+if __name__ == '__main__':
+    EngineProtocol().run()
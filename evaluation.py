@@ -0,0 +1,192 @@
+import json
+import os
+
+from bitboard import FULL, NOT_COL_A, NOT_COL_H, legalMoves
+
+# ===== EVALUATION =====
+#
+# Position features computed on whole bitboards with shifts and masks, so
+# none of them needs to walk the grid cell by cell:
+# - discs: disc difference
+# - mobility: number of legal moves
+# - potentialMobility: empty squares next to the opponent's discs
+# - frontier: own discs next to an empty square (bad, they give the
+#   opponent moves)
+# - stable: discs that can never be flipped again
+# - corners: corner discs
+# Every feature is "mine minus yours" for the side to move.
+
+CORNERS = 0x8100000000000081
+EDGES = 0xFF818181818181FF
+FEATURES = ('discs', 'mobility', 'potentialMobility', 'frontier', 'stable', 'corners')
+FEATURE_RANGE = {'discs': 64, 'mobility': 64, 'potentialMobility': 64, 'frontier': 64, 'stable': 64, 'corners': 4}
+DEFAULT_WEIGHTS = {'discs': 1, 'mobility': 8, 'potentialMobility': 3, 'frontier': -3, 'stable': 12, 'corners': 25}
+# Fitted weights written by tuning.py; when the file exists Evaluator() uses them
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.json')
+
+
+def _lineMasks():
+    """Masks of every row, column and both diagonal directions, used to find completely filled lines"""
+    rows = [0xFF << (8 * row) for row in range(8)]
+    columns = [0x0101010101010101 << col for col in range(8)]
+    diagonals, antiDiagonals = [], []
+    for start in range(-7, 8):
+        diagonal = antiDiagonal = 0
+        for row in range(8):
+            if 0 <= row + start < 8:
+                diagonal |= 1 << (row * 8 + row + start)
+                antiDiagonal |= 1 << (row * 8 + 7 - row - start)
+        diagonals.append(diagonal)
+        antiDiagonals.append(antiDiagonal)
+    return rows, columns, diagonals, antiDiagonals
+
+
+LINES = _lineMasks()
+
+
+def neighbours(mask):
+    """Every square next to a square in `mask`, in any of the 8 directions"""
+    left = (mask >> 1) & NOT_COL_H
+    right = (mask << 1) & NOT_COL_A
+    row = mask | left | right
+    return (row | (row << 8) | (row >> 8)) & FULL & ~mask
+
+
+def fullLines(occupied):
+    """For each of the 4 axes, the squares whose line along that axis is completely filled"""
+    result = []
+    for masks in LINES:
+        full = 0
+        for mask in masks:
+            if occupied & mask == mask:
+                full |= mask
+        result.append(full)
+    return result
+
+
+def stableDiscs(mover, full):
+    """Discs of `mover` that can never be flipped
+
+    # HOW IT WORKS:
+    # A disc is safe along one axis if its line along that axis is full, it
+    # sits on the board edge across that axis, or it touches one of its own
+    # stable discs along that axis. A disc safe along all 4 axes is stable.
+    # Starting from nothing, the stable set is grown until it stops changing.
+    # This finds most stable discs but not all of them (it never counts a
+    # disc protected only by a full line of the opponent's discs).
+    """
+    horizontal, vertical, diagonal, antiDiagonal = full
+    horizontal |= ~(NOT_COL_A & NOT_COL_H) & FULL
+    vertical |= 0xFF000000000000FF
+    diagonal |= EDGES
+    antiDiagonal |= EDGES
+    stable = 0
+    while True:
+        new = mover & (horizontal | ((stable << 1) & NOT_COL_A) | ((stable >> 1) & NOT_COL_H)) \
+            & (vertical | (stable << 8) | (stable >> 8)) \
+            & (diagonal | ((stable << 9) & NOT_COL_A) | ((stable >> 9) & NOT_COL_H)) \
+            & (antiDiagonal | ((stable << 7) & NOT_COL_H) | ((stable >> 7) & NOT_COL_A))
+        new &= FULL
+        if new == stable:
+            return stable
+        stable = new
+
+
+def features(mover, opponent):
+    """Return the FEATURES values for `mover` to move, as a dict"""
+    occupied = mover | opponent
+    empty = ~occupied & FULL
+    nextToEmpty = neighbours(empty)
+    full = fullLines(occupied) if mover & CORNERS or opponent & CORNERS else None
+    return {
+        'discs': mover.bit_count() - opponent.bit_count(),
+        'mobility': legalMoves(mover, opponent).bit_count() - legalMoves(opponent, mover).bit_count(),
+        'potentialMobility': (empty & neighbours(opponent)).bit_count() - (empty & neighbours(mover)).bit_count(),
+        'frontier': (mover & nextToEmpty).bit_count() - (opponent & nextToEmpty).bit_count(),
+        'stable': 0 if full is None else
+        stableDiscs(mover, full).bit_count() - stableDiscs(opponent, full).bit_count(),
+        'corners': (mover & CORNERS).bit_count() - (opponent & CORNERS).bit_count(),
+    }
+
+
+def saveWeights(path, weights, **info):
+    """Write integer feature weights (plus any notes in `info`) as a small JSON file"""
+    with open(path, 'w') as file:
+        json.dump({'weights': {name: int(weights[name]) for name in FEATURES}, **info}, file, indent=1)
+
+
+def loadWeights(path):
+    """Read a file written by saveWeights, return {feature: weight}"""
+    with open(path) as file:
+        weights = json.load(file)['weights']
+    return {name: int(weights[name]) for name in FEATURES if name in weights}
+
+
+# read once at import, a few hundred bytes of JSON
+TUNED_WEIGHTS = loadWeights(WEIGHTS_PATH) if os.path.exists(WEIGHTS_PATH) else None
+
+
+class DiscEvaluator:
+    """The original evaluation: disc difference only"""
+
+    maxScore = 64
+
+    def evaluate(self, mover, opponent):
+        return mover.bit_count() - opponent.bit_count()
+
+
+class Evaluator:
+    """Weighted sum of the bitboard features
+
+    `weights` maps feature name to an integer weight; `maxScore` is the
+    largest absolute value evaluate can return and is what the search uses
+    for its bounds. Weights not given come from weights.json if tuning.py
+    has written one, otherwise from DEFAULT_WEIGHTS.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if TUNED_WEIGHTS is not None:
+            self.weights.update(TUNED_WEIGHTS)
+        if weights is not None:
+            self.weights.update(weights)
+        self.maxScore = sum(abs(self.weights[name]) * FEATURE_RANGE[name] for name in FEATURES)
+
+    def evaluate(self, mover, opponent):
+        weights = self.weights
+        occupied = mover | opponent
+        empty = ~occupied & FULL
+        moverCount = mover.bit_count()
+        opponentCount = opponent.bit_count()
+        score = weights['discs'] * (moverCount - opponentCount)
+        score += weights['mobility'] * (legalMoves(mover, opponent).bit_count() - legalMoves(opponent, mover).bit_count())
+        nextToEmpty = neighbours(empty)
+        score += weights['frontier'] * ((mover & nextToEmpty).bit_count() - (opponent & nextToEmpty).bit_count())
+        score += weights['potentialMobility'] * (
+            (empty & neighbours(opponent)).bit_count() - (empty & neighbours(mover)).bit_count())
+        if occupied & CORNERS:
+            score += weights['corners'] * ((mover & CORNERS).bit_count() - (opponent & CORNERS).bit_count())
+            full = fullLines(occupied)
+            score += weights['stable'] * (
+                stableDiscs(mover, full).bit_count() - stableDiscs(opponent, full).bit_count())
+        return score
+
+
+class NoisyEvaluator:
+    """Another evaluator plus a pseudo-random error of up to `noise`, used to weaken the engine
+
+    The error is a hash of the position and `seed`, not a random number
+    generator, so the same position always gets the same error whatever
+    order the search visits it in, and a level plays the same on any machine.
+    """
+
+    def __init__(self, evaluator, noise, seed=0):
+        self.evaluator = evaluator
+        self.noise = noise
+        self.span = 2 * noise + 1
+        self.seed = (seed * 0x9E3779B97F4A7C15) & FULL
+        self.maxScore = evaluator.maxScore + noise
+
+    def evaluate(self, mover, opponent):
+        error = ((mover * 0xC2B2AE3D27D4EB4F) ^ (opponent * 0x165667B19E3779F9) ^ self.seed) % self.span
+        return self.evaluator.evaluate(mover, opponent) + error - self.noise
@@ -1,18 +1,32 @@
 import pygame
 import random
-import copy
-
-def directions(x, y, minX=0, minY=0, maxX=7, maxY=7):
-    validdirections = []
-    if x != minX: validdirections.append((x - 1, y))
-    if x != minX and y != minY: validdirections.append((x - 1, y - 1))
-    if x != minX and y != maxY: validdirections.append((x - 1, y + 1))
-    if x != maxX: validdirections.append((x + 1, y))
-    if x != maxX and y != minY: validdirections.append((x + 1, y - 1))
-    if x != maxX and y != maxY: validdirections.append((x + 1, y + 1))
-    if y != minY: validdirections.append((x, y - 1))
-    if y != maxY: validdirections.append((x, y + 1))
-    return validdirections
+import os
+import threading
+import time
+import othello_logic
+from piece_layer import PieceLayer
+from move_history import MoveHistory
+from game_record import GameRecord, GameRecordWriter
+from position_db import PositionDB
+from mcts import MCTSPlayer
+from difficulty import LevelPlayer
+from game_clock import GameClock, TimeManager, formatClock
+from analysis import MoveAnalyser
+from memory_profile import MemoryProfiler
+from perf_hud import PerfHud
+
+# Which engine plays the computer side: 'alphabeta' or 'mcts'
+AI_ENGINE = 'alphabeta'
+# Strength of the alpha-beta engine, one of difficulty.PROFILES
+AI_LEVEL = 'club'
+# Seconds on each side's clock for the game (None plays without a clock) and
+# seconds added after every move. Timed games suit the 'expert' level, whose
+# strength comes from time rather than a node budget.
+CLOCK_TOTAL = None
+CLOCK_INCREMENT = 2.0
+# File to write a memory profile of every AI move and every 60th frame to
+# on exit (None: no profiling). Tracing makes the game several times slower.
+MEMORY_PROFILE = None
 
 def loadImages(path, size):
     img = pygame.image.load(f"{path}").convert_alpha()
@@ -39,19 +53,103 @@ class Othello:
         self.columns = 8
         self.gameOver = False
         self.grid = Grid(self.rows, self.columns, (80, 80), self)
-        self.computerPlayer = ComputerPlayer(self.grid)
+        if AI_ENGINE == 'mcts':
+            self.computerPlayer = MCTSPlayer(self.grid)
+        else:
+            self.computerPlayer = LevelPlayer(AI_LEVEL, self.grid, reproducible=False)
+        self.history = MoveHistory()
+        self.positionDB = None
+        if os.path.exists('positions.db'):
+            try:
+                self.positionDB = PositionDB('positions.db')
+            except ValueError as error:
+                # an older format must not keep the game from starting; the hints are just left out
+                print(f'positions.db not used: {error}')
+        # the computer thinks on searchThread; a result is only used if
+        # searchGeneration has not moved on since the search started
+        self.searchThread = None
+        self.searchResult = None
+        self.searchGeneration = 0
+        self.searchStarted = 0
+        self.searchAllocation = None
+        self.clock = GameClock(CLOCK_TOTAL, CLOCK_INCREMENT) if CLOCK_TOTAL else None
+        self.timeManager = TimeManager()
+        self.lostOnTime = None
+        if self.clock is not None:
+            self.clock.start(self.currentPlayer)
+        # move scores shown on the board, switched with the A key; the
+        # analyser process is started the first time it is needed
+        self.analyser = None
+        self.analysing = False
+        self.profiler = MemoryProfiler() if MEMORY_PROFILE else None
+        if self.profiler is not None:
+            self.profiler.start()
+        self.frameCount = 0
+        # frame times and search statistics in the side panel, switched with the P key
+        self.hud = PerfHud()
         self.RUN = True
 
     def run(self):
         while self.RUN == True:
-            self.input()
-            self.update()
+            if self.hud.visible:
+                self.timedFrame()
+            else:
+                self.input()
+                self.update()
+                self.drawFrame()
+            self.frameCount += 1
+        self.shutdown()
+
+    def timedFrame(self):
+        hud = self.hud
+        hud.beginFrame()
+        self.input()
+        hud.phase('input')
+        self.update()
+        hud.phase('update')
+        self.drawFrame()
+        hud.phase('draw')
+        hud.endFrame()
+
+    def drawFrame(self):
+        # tracing is global, so frames are only sampled while no search runs
+        if self.profiler is not None and self.frameCount % 60 == 0 and not self.searchBusy():
+            self.profiler.record('frame', str(self.frameCount), self.draw)
+        else:
             self.draw()
 
+    def shutdown(self):
+        self.cancelSearch()
+        if self.searchThread is not None:
+            self.searchThread.join(1.0)
+        if self.positionDB is not None:
+            self.positionDB.close()
+        if hasattr(self.computerPlayer, 'close'):
+            self.computerPlayer.close()
+        if self.analyser is not None:
+            self.analyser.close()
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler.write(MEMORY_PROFILE)
+
     def input(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                self.cancelSearch()
                 self.RUN = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT:
+                    self.takeBack()
+                elif event.key == pygame.K_RIGHT:
+                    self.stepForward()
+                elif event.key in (pygame.K_UP, pygame.K_DOWN):
+                    self.switchVariation(1 if event.key == pygame.K_DOWN else -1)
+                elif event.key == pygame.K_a:
+                    self.analysing = not self.analysing
+                    if self.analysing and self.analyser is None:
+                        self.analyser = MoveAnalyser()
+                elif event.key == pygame.K_p:
+                    self.hud.toggle()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 3:
                     self.grid.printGameLogicBoard()
@@ -59,17 +157,19 @@ class Othello:
                     if self.currentPlayer ==1 and not self.gameOver :
                         x, y = pygame.mouse.get_pos()
                         x, y = (x - 80) // 80, (y - 80) // 80
-                        validCells = self.grid.findAvailMoves(self.grid.gridLogic, self.currentPlayer)
+                        validCells = set(self.grid.findAvailMoves(self.grid.gridLogic, self.currentPlayer))
                         if not validCells:
                             pass
                         else:
                             if (y, x) in validCells:
                                 self.grid.insertToken(self.grid.gridLogic, self.currentPlayer, y, x)
                                 swappableTiles = self.grid.swappableTiles(y, x, self.grid.gridLogic, self.currentPlayer)
+                                self.history.record((y, x), self.currentPlayer, swappableTiles)
                                 for tile in swappableTiles:
                                     self.grid.animateTransitions(tile, self.currentPlayer)
                                     self.grid.gridLogic[tile[0]][tile[1]] *= -1
                                 self.currentPlayer *= -1
+                                self.pressClock()
                                 self.time = pygame.time.get_ticks()
                     if self.gameOver:
                         x, y = pygame.mouse.get_pos()
@@ -78,34 +178,151 @@ class Othello:
                         button_y_min = 240 + 160
                         button_y_max = 240 + 160 + 80
                         if button_x_min <= x <= button_x_max and button_y_min <= y <= button_y_max:
+                            self.cancelSearch()
                             self.grid.newGame()
+                            self.history.reset()
                             self.gameOver = False
                             self.currentPlayer = 1
+                            self.lostOnTime = None
+                            if self.clock is not None:
+                                self.clock.reset()
+                                self.clock.start(self.currentPlayer)
                             self.time = pygame.time.get_ticks()
 
+    def pressClock(self):
+        if self.clock is not None:
+            self.clock.press()
+
+    def startSearch(self):
+        grid = [row[:] for row in self.grid.gridLogic]
+        self.searchResult = None
+        if self.clock is not None:
+            self.searchAllocation = self.timeManager.allocate(
+                self.clock.remaining(self.currentPlayer), self.clock.increment, grid, self.currentPlayer)
+            self.computerPlayer.budget = self.searchAllocation
+        self.searchStarted = self.searchGeneration
+        self.searchThread = threading.Thread(target=self.search, args=(grid, self.searchGeneration), daemon=True)
+        self.searchThread.start()
+
+    def search(self, grid, generation):
+        start = time.perf_counter()
+        if self.profiler is not None:
+            cell, score = self.profiler.record('move', 'black', lambda: self.computerPlayer.computerHard(
+                grid, 5, None, None, -1), lambda: self.computerPlayer.nodes)
+        else:
+            cell, score = self.computerPlayer.computerHard(grid, 5, None, None, -1)
+        used = time.perf_counter() - start
+        if AI_ENGINE == 'mcts':
+            # MCTS has no depth, and once its tree is full it adds no nodes; playouts measure its work
+            self.hud.searched(None, self.computerPlayer.lastPlayouts, used, 'playouts')
+        else:
+            self.hud.searched(self.computerPlayer.depth, self.computerPlayer.nodes, used)
+        self.searchResult = (generation, cell, used)
+
+    def cancelSearch(self):
+        """Make any search in progress stop soon and its result be ignored"""
+        self.searchGeneration += 1
+        self.searchResult = None
+        if self.searchThread is not None and self.searchThread.is_alive():
+            self.computerPlayer.stopped = True
+
+    def searchBusy(self):
+        """True while a search thread is running; a cancelled one is stopped again until it exits"""
+        if self.searchThread is None or not self.searchThread.is_alive():
+            return False
+        if self.searchStarted != self.searchGeneration:
+            self.computerPlayer.stopped = True
+        return True
+
     def update(self):
+        if self.clock is not None and not self.gameOver and self.clock.flagged(self.currentPlayer):
+            self.lostOnTime = self.currentPlayer
+            self.cancelSearch()
+            self.endGame()
+            return
+        if self.analyser is not None:
+            # only the human's moves are analysed, and not while the computer is thinking
+            if self.analysing and self.currentPlayer == self.player1 and not self.gameOver:
+                self.analyser.analyse(self.grid.gridLogic, self.currentPlayer)
+            else:
+                self.analyser.pause()
+            self.analyser.poll()
         if self.currentPlayer == -1:
             new_time = pygame.time.get_ticks()
-            if new_time - self.time >= 100:
+            if new_time - self.time >= 100 and not self.searchBusy():
                 if not self.grid.findAvailMoves(self.grid.gridLogic, self.currentPlayer):
-                    self.gameOver = True
+                    self.endGame()
                     return
-                cell, score = self.computerPlayer.computerHard(self.grid.gridLogic, 5, -64, 64, -1)
+                result, self.searchResult = self.searchResult, None
+                if result is None or result[0] != self.searchGeneration:
+                    self.startSearch()
+                    return
+                generation, cell, used = result
+                if self.clock is not None:
+                    self.timeManager.record(self.searchAllocation, used)
                 self.grid.insertToken(self.grid.gridLogic, self.currentPlayer, cell[0], cell[1])
                 swappableTiles = self.grid.swappableTiles(cell[0], cell[1], self.grid.gridLogic, self.currentPlayer)
+                self.history.record(cell, self.currentPlayer, swappableTiles)
                 for tile in swappableTiles:
                     self.grid.animateTransitions(tile, self.currentPlayer)
                     self.grid.gridLogic[tile[0]][tile[1]] *= -1
                 self.currentPlayer *= -1
+                self.pressClock()
         self.grid.player1Score = self.grid.calculatePlayerScore(self.player1)
         self.grid.player2Score = self.grid.calculatePlayerScore(self.player2)
         if not self.grid.findAvailMoves(self.grid.gridLogic, self.currentPlayer):
-            self.gameOver = True
+            self.endGame()
+            return
+
+    def endGame(self):
+        if self.gameOver:
             return
+        self.gameOver = True
+        if self.clock is not None:
+            self.clock.stop()
+        result = self.grid.calculatePlayerScore(self.player1) - self.grid.calculatePlayerScore(self.player2)
+        with GameRecordWriter('games.rec') as writer:
+            writer.write(GameRecord(self.history.moves(), self.player1, result))
+
+    def takeBack(self):
+        # take back the computer's reply too, so it is the human's turn again
+        changed = self.history.undo(self.grid.gridLogic)
+        while self.history.sideToMove(self.player1) != self.player1 and self.history.canUndo():
+            changed |= self.history.undo(self.grid.gridLogic)
+        self.afterNavigation(changed)
+
+    def stepForward(self):
+        changed = self.history.redo(self.grid.gridLogic)
+        while self.history.sideToMove(self.player1) != self.player1 and self.history.canRedo():
+            changed |= self.history.redo(self.grid.gridLogic)
+        self.afterNavigation(changed)
+
+    def switchVariation(self, step):
+        self.afterNavigation(self.history.switchVariation(self.grid.gridLogic, step))
+
+    def afterNavigation(self, changed):
+        if not changed:
+            return
+        self.cancelSearch()
+        self.grid.pieces.resync(changed)
+        self.grid.frontier.update(self.grid.gridLogic, changed)
+        self.currentPlayer = self.history.sideToMove(self.player1)
+        self.gameOver = False
+        self.lostOnTime = None
+        if self.clock is not None:
+            self.clock.start(self.currentPlayer)
+        self.time = pygame.time.get_ticks()
 
     def draw(self):
-        self.screen.fill((0, 0, 0))
+        # the board covers the window left of x = 960, only the strip right of it needs clearing
+        self.screen.fill((0, 0, 0), (960, 0, 1100 - 960, 800))
         self.grid.drawGrid(self.screen)
+        if self.clock is not None:
+            for y, player, name in ((300, self.player1, 'White'), (400, self.player2, 'Black')):
+                text = self.grid.font.render(f'{name} {formatClock(self.clock.remaining(player))}', True, 'White')
+                self.screen.blit(text, (900, y))
+        if self.hud.visible:
+            self.hud.draw(self.screen, self.grid.analysisFont, (900, 460))
         if self.gameOver:
             end_screen_img = self.grid.endScreen()
             end_screen_x = (1100 - 320) // 2
@@ -122,18 +339,25 @@ class Grid:
         self.whitetoken = loadImages('WhiteToken.png', size)
         self.blacktoken = loadImages('BlackToken.png', size)
         self.font = pygame.font.SysFont('Arial', 20, True, False)
+        self.analysisFont = pygame.font.SysFont('Arial', 14, True, False)
         self.transitionWhiteToBlack = [loadImages(f'BlackToWhite{i}.png', self.size) for i in range(1, 4)]
         self.transitionBlackToWhite = [loadImages(f'WhiteToBlack{i}.png', self.size) for i in range(1, 4)]
         self.player1Score = 0
         self.player2Score = 0
         self.bg = self.loadBackGroundImages()
-        self.tokens = {}
         self.gridBg = self.createbgimg()
+        self.pieces = PieceLayer({1: self.whitetoken, -1: self.blacktoken},
+                                 {1: self.transitionWhiteToBlack, -1: self.transitionBlackToWhite}, self.size, self.gridBg)
+        # empty squares next to a disc, kept in step with gridLogic by insertToken and afterNavigation
+        self.frontier = othello_logic.Frontier()
         self.gridLogic = self.regenGrid(self.y, self.x)
 
     def newGame(self):
-        self.tokens.clear()
-        self.gridLogic = self.regenGrid(self.y,self.x)
+        self.pieces.reset()
+        self.frontier.reset()
+        for line in self.gridLogic:
+            line[:] = [0] * self.x
+        self.placeStartTokens(self.gridLogic)
 
     def loadBackGroundImages(self):
         alpha = 'ABCDEFGHI'
@@ -150,6 +374,8 @@ class Grid:
         winner_text = "Congratulations, You Won!!" if self.player1Score > self.player2Score else "Bad Luck, You Lost"
         if self.player1Score == self.player2Score:
             winner_text = "It's a Tie!"
+        if self.GAME.lostOnTime is not None:
+            winner_text = "Out of Time, You Lost" if self.GAME.lostOnTime == self.GAME.player1 else "Computer Ran Out of Time!"
         end_text = self.font.render(winner_text, True, 'White')
         end_text_rect = end_text.get_rect(center=(160, 100))
         end_screen_img.blit(end_text, end_text_rect)
@@ -194,26 +420,41 @@ class Grid:
             for x in range(columns):
                 line.append(0)
             grid.append(line)
+        self.placeStartTokens(grid)
+        return grid
+
+    def placeStartTokens(self, grid):
         self.insertToken(grid, 1, 3, 3)
         self.insertToken(grid, -1, 3, 4)
         self.insertToken(grid, 1, 4, 4)
         self.insertToken(grid, -1, 4, 3)
-        return grid
 
     def drawScore(self, player, score):
         textImg = self.font.render(f'{player} : {score}', 1, 'White')
         return textImg
 
     def drawGrid(self, window):
-        window.blit(self.gridBg, (0, 0))
+        # the board and its discs come from the piece layer's cached surface
+        self.pieces.draw(window, self.gridLogic)
         window.blit(self.drawScore('White', self.player1Score), (900, 100))
         window.blit(self.drawScore('Black', self.player2Score), (900, 200))
-        for token in self.tokens.values():
-            token.draw(window)
         availMoves = self.findAvailMoves(self.gridLogic, self.GAME.currentPlayer)
         if self.GAME.currentPlayer == 1:
             for move in availMoves:
                 pygame.draw.rect(window, 'White', (80 + (move[1] * 80) + 30, 80 + (move[0] * 80) + 30, 20, 20))
+            if self.GAME.positionDB is not None:
+                stats = self.GAME.positionDB.lookup(self.gridLogic, self.GAME.currentPlayer)
+                if stats is not None and stats.bestMove in availMoves:
+                    move = stats.bestMove
+                    pygame.draw.rect(window, 'Gold', (80 + (move[1] * 80) + 30, 80 + (move[0] * 80) + 30, 20, 20))
+            analyser = self.GAME.analyser
+            if self.GAME.analysing and analyser is not None and analyser.scores:
+                # score and depth under each marker, the best move's in gold
+                best = max(score for score, _ in analyser.scores.values())
+                for move, (score, depth) in analyser.scores.items():
+                    text = self.analysisFont.render(f'{analyser.label(score)} d{depth}', True,
+                                                    'Gold' if score == best else 'White', 'Black')
+                    window.blit(text, text.get_rect(center=(80 + (move[1] * 80) + 40, 80 + (move[0] * 80) + 64)))
 
     def printGameLogicBoard(self):
         print('  | A | B | C | D | E | F | G | H |')
@@ -225,160 +466,24 @@ class Grid:
         print()
 
     def findValidCells(self, grid, curPlayer):
-        validCellToClick = []
-        for gridX, row in enumerate(grid):
-            for gridY, col in enumerate(row):
-                if grid[gridX][gridY] != 0:
-                    continue
-                DIRECTIONS = directions(gridX, gridY)
-                for direction in DIRECTIONS:
-                    dirX, dirY = direction
-                    checkedCell = grid[dirX][dirY]
-                    if checkedCell == 0 or checkedCell == curPlayer:
-                        continue
-                    if (gridX, gridY) in validCellToClick:
-                        continue
-                    validCellToClick.append((gridX, gridY))
-        return validCellToClick
+        return othello_logic.findValidCells(grid, curPlayer, self.frontier if grid is self.gridLogic else None)
 
     def swappableTiles(self, x, y, grid, player):
-        surroundCells = directions(x, y)
-        if len(surroundCells) == 0:
-            return []
-        swappableTiles = []
-        for checkCell in surroundCells:
-            checkX, checkY = checkCell
-            difX, difY = checkX - x, checkY - y
-            currentLine = []
-            RUN = True
-            while RUN:
-                if grid[checkX][checkY] == player * -1:
-                    currentLine.append((checkX, checkY))
-                elif grid[checkX][checkY] == player:
-                    RUN = False
-                    break
-                elif grid[checkX][checkY] == 0:
-                    currentLine.clear()
-                    RUN = False
-                    break
-                checkX += difX
-                checkY += difY
-                if checkX < 0 or checkX > 7 or checkY < 0 or checkY > 7:
-                    currentLine.clear()
-                    RUN = False
-            if len(currentLine) > 0:
-                swappableTiles.extend(currentLine)
-        return swappableTiles
+        return othello_logic.swappableTiles(x, y, grid, player)
 
     def findAvailMoves(self, grid, currentPlayer):
-        validCells = self.findValidCells(grid, currentPlayer)
-        playableCells = []
-        for cell in validCells:
-            x, y = cell
-            if cell in playableCells:
-                continue
-            swapTiles = self.swappableTiles(x, y, grid, currentPlayer)
-            if len(swapTiles) > 0:
-                playableCells.append(cell)
-        return playableCells
+        return othello_logic.findAvailMoves(grid, currentPlayer, self.frontier if grid is self.gridLogic else None)
 
     def insertToken(self, grid, curplayer, y, x):
-        tokenImage = self.whitetoken if curplayer == 1 else self.blacktoken
-        self.tokens[(y, x)] = Token(curplayer, y, x, tokenImage, self.GAME)
-        grid[y][x] = self.tokens[(y, x)].player
+        # only ever called on gridLogic, including while regenGrid builds it
+        grid[y][x] = curplayer
+        self.frontier.place(y, x)
 
     def animateTransitions(self, cell, player):
-        if player == 1:
-            self.tokens[(cell[0], cell[1])].transition(self.transitionWhiteToBlack, self.whitetoken)
-            self.tokens[(cell[0], cell[1])].player = 1
+        if self.GAME.hud.visible:
+            self.GAME.hud.animate(lambda: self.pieces.animate(cell[0], cell[1], self.GAME.draw))
         else:
-            self.tokens[(cell[0], cell[1])].transition(self.transitionBlackToWhite, self.blacktoken)
-            self.tokens[(cell[0], cell[1])].player = -1
-
-class Token:
-    def __init__(self, player, gridX, gridY, image, main):
-        self.player = player
-        self.gridX = gridX
-        self.gridY = gridY
-        self.posX = 80 + (gridY * 80)
-        self.posY = 80 + (gridX * 80)
-        self.GAME = main
-        self.image = image
-
-    def transition(self, transitionImages, tokenImage):
-        for i in range(30):
-            self.image = transitionImages[i // 10]
-            self.GAME.draw()
-        self.image = tokenImage
-
-    def draw(self, window):
-        window.blit(self.image, (self.posX, self.posY))
-
-class ComputerPlayer:
-    def __init__(self, gridObject):
-        self.grid = gridObject
-
-    def searchFunction(self, depth, move, newGrid, player, alpha, beta):
-        X, Y = move
-        swappableTiles = self.grid.swappableTiles(X, Y, newGrid, player)
-        newGrid[X][Y] = player
-        for tile in swappableTiles:
-            newGrid[tile[0]][tile[1]] = player
-        bestMove, value = self.computerHard(newGrid, depth-1, alpha, beta, player * -1)
-        return bestMove, value
-
-    def computerHard(self, grid, depth, alpha, beta, player):
-        newGrid = copy.deepcopy(grid)
-        availMoves = self.grid.findAvailMoves(newGrid, player)
-        if depth == 0 or len(availMoves) == 0:
-            bestMove, score = None, self.evaluateBoard(grid, player)
-            return bestMove, score
-        if player < 0:
-            bestScore = -64
-            bestMove = None
-            for move in availMoves:
-                X, Y = move
-                tempGrid = copy.deepcopy(newGrid)
-                swappableTiles = self.grid.swappableTiles(X, Y, tempGrid, player)
-                tempGrid[X][Y] = player
-                for tile in swappableTiles:
-                    tempGrid[tile[0]][tile[1]] = player
-                _, value = self.computerHard(tempGrid, depth-1, alpha, beta, player * -1)
-                if value > bestScore:
-                    bestScore = value
-                    bestMove = move
-                alpha = max(alpha, bestScore)
-                if beta <= alpha:
-                    break
-            return bestMove, bestScore
-        else:
-            bestScore = 64
-            bestMove = None
-            for move in availMoves:
-                X, Y = move
-                tempGrid = copy.deepcopy(newGrid)
-                swappableTiles = self.grid.swappableTiles(X, Y, tempGrid, player)
-                tempGrid[X][Y] = player
-                for tile in swappableTiles:
-                    tempGrid[tile[0]][tile[1]] = player
-                _, value = self.computerHard(tempGrid, depth-1, alpha, beta, player * -1)
-                if value < bestScore:
-                    bestScore = value
-                    bestMove = move
-                beta = min(beta, bestScore)
-                if beta <= alpha:
-                    break
-            return bestMove, bestScore
-
-    def evaluateBoard(self, grid, player):
-        score = 0
-        for i in range(len(grid)):
-            for j in range(len(grid[i])):
-                if grid[i][j] == player:
-                    score += 1
-                elif grid[i][j] == -player:
-                    score -= 1
-        return score
+            self.pieces.animate(cell[0], cell[1], self.GAME.draw)
 
 if __name__ == '__main__':
     game = Othello()
@@ -1,18 +1,8 @@
 import pygame
 import random
-import copy
-
-def directions(x, y, minX=0, minY=0, maxX=7, maxY=7):
-    validdirections = []
-    if x != minX: validdirections.append((x - 1, y))
-    if x != minX and y != minY: validdirections.append((x - 1, y - 1))
-    if x != minX and y != maxY: validdirections.append((x - 1, y + 1))
-    if x != maxX: validdirections.append((x + 1, y))
-    if x != maxX and y != minY: validdirections.append((x + 1, y - 1))
-    if x != maxX and y != maxY: validdirections.append((x + 1, y + 1))
-    if y != minY: validdirections.append((x, y - 1))
-    if y != maxY: validdirections.append((x, y + 1))
-    return validdirections
+import othello_logic
+from piece_layer import PieceLayer
+from move_history import MoveHistory
 
 def loadImages(path, size):
     img = pygame.image.load(f"{path}").convert_alpha()
@@ -38,6 +28,7 @@ class Othello:
         self.rows = 8
         self.columns = 8
         self.gameOver = False
+        self.history = MoveHistory()
         self.grid = Grid(self.rows, self.columns, (80, 80), self)
         self.RUN = True
         self.font = pygame.font.SysFont('Arial', 24, True, False)
@@ -52,19 +43,28 @@ class Othello:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.RUN = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT:
+                    self.afterNavigation(self.history.undo(self.grid.gridLogic))
+                elif event.key == pygame.K_RIGHT:
+                    self.afterNavigation(self.history.redo(self.grid.gridLogic))
+                elif event.key in (pygame.K_UP, pygame.K_DOWN):
+                    step = 1 if event.key == pygame.K_DOWN else -1
+                    self.afterNavigation(self.history.switchVariation(self.grid.gridLogic, step))
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 3:
                     self.grid.printGameLogicBoard()
                 if event.button == 1 and not self.gameOver:
                     x, y = pygame.mouse.get_pos()
                     x, y = (x - 80) // 80, (y - 80) // 80
-                    validCells = self.grid.findAvailMoves(self.grid.gridLogic, self.currentPlayer)
+                    validCells = set(self.grid.findAvailMoves(self.grid.gridLogic, self.currentPlayer))
                     if not validCells:
                         pass
                     else:
                         if (y, x) in validCells:
                             self.grid.insertToken(self.grid.gridLogic, self.currentPlayer, y, x)
                             swappableTiles = self.grid.swappableTiles(y, x, self.grid.gridLogic, self.currentPlayer)
+                            self.history.record((y, x), self.currentPlayer, swappableTiles)
                             for tile in swappableTiles:
                                 self.grid.animateTransitions(tile, self.currentPlayer)
                                 self.grid.gridLogic[tile[0]][tile[1]] *= -1
@@ -77,10 +77,19 @@ class Othello:
                     button_y_max = 240 + 160 + 80
                     if button_x_min <= x <= button_x_max and button_y_min <= y <= button_y_max:
                         self.grid.newGame()
+                        self.history.reset()
                         self.gameOver = False
                         self.currentPlayer = 1
                         self.time = pygame.time.get_ticks()
 
+    def afterNavigation(self, changed):
+        if not changed:
+            return
+        self.grid.pieces.resync(changed)
+        self.grid.frontier.update(self.grid.gridLogic, changed)
+        self.currentPlayer = self.history.sideToMove(self.player1)
+        self.gameOver = False
+
     def update(self):
         self.grid.player1Score = self.grid.calculatePlayerScore(self.player1)
         self.grid.player2Score = self.grid.calculatePlayerScore(self.player2)
@@ -94,7 +103,8 @@ class Othello:
                 print(f"Player {'White' if self.currentPlayer == 1 else 'Black'}'s turn (no moves available for the other player)")
 
     def draw(self):
-        self.screen.fill((0, 0, 0))
+        # the board covers the window left of x = 960, only the strip right of it needs clearing
+        self.screen.fill((0, 0, 0), (960, 0, 1100 - 960, 800))
         self.grid.drawGrid(self.screen)
         
         if not self.gameOver:
@@ -129,13 +139,19 @@ class Grid:
         self.player1Score = 0
         self.player2Score = 0
         self.bg = self.loadBackGroundImages()
-        self.tokens = {}
         self.gridBg = self.createbgimg()
+        self.pieces = PieceLayer({1: self.whitetoken, -1: self.blacktoken},
+                                 {1: self.transitionWhiteToBlack, -1: self.transitionBlackToWhite}, self.size, self.gridBg)
+        # empty squares next to a disc, kept in step with gridLogic by insertToken and afterNavigation
+        self.frontier = othello_logic.Frontier()
         self.gridLogic = self.regenGrid(self.y, self.x)
 
     def newGame(self):
-        self.tokens.clear()
-        self.gridLogic = self.regenGrid(self.y,self.x)
+        self.pieces.reset()
+        self.frontier.reset()
+        for line in self.gridLogic:
+            line[:] = [0] * self.x
+        self.placeStartTokens(self.gridLogic)
 
     def loadBackGroundImages(self):
         alpha = 'ABCDEFGHI'
@@ -211,22 +227,24 @@ class Grid:
             for x in range(columns):
                 line.append(0)
             grid.append(line)
+        self.placeStartTokens(grid)
+        return grid
+
+    def placeStartTokens(self, grid):
         self.insertToken(grid, 1, 3, 3)
         self.insertToken(grid, -1, 3, 4)
         self.insertToken(grid, 1, 4, 4)
         self.insertToken(grid, -1, 4, 3)
-        return grid
 
     def drawScore(self, player, score):
         textImg = self.font.render(f'{player} : {score}', 1, 'White')
         return textImg
 
     def drawGrid(self, window):
-        window.blit(self.gridBg, (0, 0))
+        # the board and its discs come from the piece layer's cached surface
+        self.pieces.draw(window, self.gridLogic)
         window.blit(self.drawScore('White', self.player1Score), (900, 100))
         window.blit(self.drawScore('Black', self.player2Score), (900, 200))
-        for token in self.tokens.values():
-            token.draw(window)
         availMoves = self.findAvailMoves(self.gridLogic, self.GAME.currentPlayer)
         for move in availMoves:
             highlight_color = 'White' if self.GAME.currentPlayer == 1 else 'Black'
@@ -242,94 +260,21 @@ class Grid:
         print()
 
     def findValidCells(self, grid, curPlayer):
-        validCellToClick = []
-        for gridX, row in enumerate(grid):
-            for gridY, col in enumerate(row):
-                if grid[gridX][gridY] != 0:
-                    continue
-                DIRECTIONS = directions(gridX, gridY)
-                for direction in DIRECTIONS:
-                    dirX, dirY = direction
-                    checkedCell = grid[dirX][dirY]
-                    if checkedCell == 0 or checkedCell == curPlayer:
-                        continue
-                    if (gridX, gridY) in validCellToClick:
-                        continue
-                    validCellToClick.append((gridX, gridY))
-        return validCellToClick
+        return othello_logic.findValidCells(grid, curPlayer, self.frontier if grid is self.gridLogic else None)
 
     def swappableTiles(self, x, y, grid, player):
-        surroundCells = directions(x, y)
-        if len(surroundCells) == 0:
-            return []
-        swappableTiles = []
-        for checkCell in surroundCells:
-            checkX, checkY = checkCell
-            difX, difY = checkX - x, checkY - y
-            currentLine = []
-            RUN = True
-            while RUN:
-                if grid[checkX][checkY] == player * -1:
-                    currentLine.append((checkX, checkY))
-                elif grid[checkX][checkY] == player:
-                    RUN = False
-                    break
-                elif grid[checkX][checkY] == 0:
-                    currentLine.clear()
-                    RUN = False
-                    break
-                checkX += difX
-                checkY += difY
-                if checkX < 0 or checkX > 7 or checkY < 0 or checkY > 7:
-                    currentLine.clear()
-                    RUN = False
-            if len(currentLine) > 0:
-                swappableTiles.extend(currentLine)
-        return swappableTiles
+        return othello_logic.swappableTiles(x, y, grid, player)
 
     def findAvailMoves(self, grid, currentPlayer):
-        validCells = self.findValidCells(grid, currentPlayer)
-        playableCells = []
-        for cell in validCells:
-            x, y = cell
-            if cell in playableCells:
-                continue
-            swapTiles = self.swappableTiles(x, y, grid, currentPlayer)
-            if len(swapTiles) > 0:
-                playableCells.append(cell)
-        return playableCells
+        return othello_logic.findAvailMoves(grid, currentPlayer, self.frontier if grid is self.gridLogic else None)
 
     def insertToken(self, grid, curplayer, y, x):
-        tokenImage = self.whitetoken if curplayer == 1 else self.blacktoken
-        self.tokens[(y, x)] = Token(curplayer, y, x, tokenImage, self.GAME)
-        grid[y][x] = self.tokens[(y, x)].player
+        # only ever called on gridLogic, including while regenGrid builds it
+        grid[y][x] = curplayer
+        self.frontier.place(y, x)
 
     def animateTransitions(self, cell, player):
-        if player == 1:
-            self.tokens[(cell[0], cell[1])].transition(self.transitionWhiteToBlack, self.whitetoken)
-            self.tokens[(cell[0], cell[1])].player = 1
-        else:
-            self.tokens[(cell[0], cell[1])].transition(self.transitionBlackToWhite, self.blacktoken)
-            self.tokens[(cell[0], cell[1])].player = -1
-
-class Token:
-    def __init__(self, player, gridX, gridY, image, main):
-        self.player = player
-        self.gridX = gridX
-        self.gridY = gridY
-        self.posX = 80 + (gridY * 80)
-        self.posY = 80 + (gridX * 80)
-        self.GAME = main
-        self.image = image
-
-    def transition(self, transitionImages, tokenImage):
-        for i in range(30):
-            self.image = transitionImages[i // 10]
-            self.GAME.draw()
-        self.image = tokenImage
-
-    def draw(self, window):
-        window.blit(self.image, (self.posX, self.posY))
+        self.pieces.animate(cell[0], cell[1], self.GAME.draw)
 
 if __name__ == '__main__':
     game = Othello()
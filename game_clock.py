@@ -0,0 +1,185 @@
+import time
+
+import othello_logic
+from difficulty import LevelPlayer
+
+# ===== TIME CONTROL =====
+#
+# A timed game gives each side `total` seconds for the whole game plus
+# `increment` seconds added after each of its moves. Running out of time
+# loses the game.
+
+# Empty squares of the positions treated as the midgame, where a move
+# decides the most and gets extra time
+MIDGAME_EMPTIES = range(20, 45)
+
+
+def formatClock(seconds):
+    """m:ss.s for the display, never negative"""
+    seconds = max(0.0, seconds)
+    minutes, seconds = divmod(seconds, 60)
+    return f'{int(minutes)}:{seconds:04.1f}'
+
+
+class GameClock:
+    """Chess clock for both sides: total time plus increment
+
+    # HOW IT WORKS:
+    # `running` is the side whose time is going down and `started` the
+    # perf_counter time its turn began. `press()` ends that turn: the time
+    # it took is taken off its clock, the increment added, and the other
+    # side's clock starts. Nothing ticks in the background; `remaining`
+    # works the running side's time out when asked.
+    """
+
+    def __init__(self, total, increment=0.0):
+        self.total = total
+        self.increment = increment
+        self.reset()
+
+    def reset(self):
+        self.times = {1: float(self.total), -1: float(self.total)}
+        self.running = None
+        self.started = 0.0
+
+    def start(self, player):
+        """Start `player`'s clock (None: neither), stopping the other one without an increment"""
+        if self.running is not None:
+            self.times[self.running] -= time.perf_counter() - self.started
+        self.running = player
+        self.started = time.perf_counter()
+
+    def stop(self):
+        """Stop the running clock, at the end of the game"""
+        self.start(None)
+
+    def press(self):
+        """End the running side's move; return how long it took"""
+        player = self.running
+        used = time.perf_counter() - self.started
+        self.times[player] += self.increment - used
+        self.running = -player
+        self.started = time.perf_counter()
+        return used
+
+    def remaining(self, player):
+        if player == self.running:
+            return self.times[player] - (time.perf_counter() - self.started)
+        return self.times[player]
+
+    def flagged(self, player):
+        return self.remaining(player) <= 0
+
+
+class TimeManager:
+    """Decides how long the engine may think on each move and keeps statistics on how well it kept to it
+
+    # HOW IT WORKS:
+    # The clock left, less a safety margin, is shared evenly over the moves
+    # the side still expects to play (half the empty squares, at least
+    # `minMoves` so the last moves are not starved), and most of the
+    # increment is spent as it arrives. Midgame positions get `midgameFactor`
+    # times that share, a forced move next to nothing, and no move more than
+    # `maxFraction` of the usable time, so one long think cannot lose on
+    # time. The allocation is recomputed every move, so time saved or
+    # overspent is shared out again.
+    # The margin is `reserve` seconds plus `moveOverhead` per expected move,
+    # covering what happens around the search: showing the move, thread
+    # hand over and the like.
+    #
+    # WHAT IT HOLDS:
+    # moves: (allocated, used) seconds for every move recorded
+    """
+
+    def __init__(self, minMoves=6, midgameFactor=1.5, maxFraction=0.25, reserve=0.1, moveOverhead=0.01,
+                 forcedMove=0.01):
+        self.minMoves = minMoves
+        self.midgameFactor = midgameFactor
+        self.maxFraction = maxFraction
+        self.reserve = reserve
+        self.moveOverhead = moveOverhead
+        self.forcedMove = forcedMove
+        self.moves = []
+
+    def allocate(self, remaining, increment, grid, player):
+        """Seconds to search the position `grid` with `remaining` seconds left on `player`'s clock"""
+        empties = sum(row.count(0) for row in grid)
+        movesLeft = max(self.minMoves, (empties + 1) // 2)
+        usable = remaining - self.reserve - movesLeft * self.moveOverhead
+        if usable <= 0:
+            return 0.0
+        if len(othello_logic.findAvailMoves(grid, player)) <= 1:
+            return min(self.forcedMove, usable)
+        share = usable / movesLeft + increment * 0.8
+        if empties in MIDGAME_EMPTIES:
+            share *= self.midgameFactor
+        return min(share, usable * self.maxFraction)
+
+    def record(self, allocated, used):
+        self.moves.append((allocated, used))
+
+    def overshootStats(self):
+        """Overshoot (time used beyond the allocation) over the recorded moves, in ms
+
+        Returns a dict with the number of moves, how many went over, and the
+        mean, 95th percentile and largest overshoot.
+        """
+        overshoots = sorted(max(0.0, used - allocated) * 1000 for allocated, used in self.moves)
+        if not overshoots:
+            return {'moves': 0, 'over': 0, 'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+        return {
+            'moves': len(overshoots),
+            'over': sum(1 for overshoot in overshoots if overshoot > 0),
+            'mean': sum(overshoots) / len(overshoots),
+            'p95': overshoots[min(len(overshoots) - 1, int(len(overshoots) * 0.95))],
+            'max': overshoots[-1],
+        }
+
+
+def playTimedGame(total, increment=0.0, level='expert', seed=0):
+    """Engine against engine on one clock; return (disc difference for white, clock, {player: TimeManager})"""
+    players = {1: LevelPlayer(level, seed=seed), -1: LevelPlayer(level, seed=seed + 1)}
+    managers = {1: TimeManager(), -1: TimeManager()}
+    clock = GameClock(total, increment)
+    grid = othello_logic.startGrid()
+    player = 1
+    passes = 0
+    clock.start(player)
+    while passes < 2:
+        if not othello_logic.findAvailMoves(grid, player):
+            passes += 1
+            player *= -1
+            clock.start(player)
+            continue
+        passes = 0
+        allocated = managers[player].allocate(clock.remaining(player), increment, grid, player)
+        players[player].budget = allocated
+        start = time.perf_counter()
+        move, _ = players[player].computerHard(grid, 0, None, None, player)
+        managers[player].record(allocated, time.perf_counter() - start)
+        othello_logic.applyMove(grid, move, player)
+        clock.press()
+        if clock.flagged(player):
+            break
+        player *= -1
+    return othello_logic.discDifference(grid), clock, managers
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Play an engine game on a clock and report time use')
+    parser.add_argument('--total', type=float, default=30.0, help='seconds per side for the game')
+    parser.add_argument('--increment', type=float, default=0.5)
+    parser.add_argument('--level', default='expert')
+    parser.add_argument('--games', type=int, default=1)
+    args = parser.parse_args()
+    for game in range(args.games):
+        result, clock, managers = playTimedGame(args.total, args.increment, args.level, seed=game * 2)
+        print(f'game {game + 1}: white {result:+d} discs')
+        for player, name in ((1, 'white'), (-1, 'black')):
+            stats = managers[player].overshootStats()
+            used = sum(used for _, used in managers[player].moves)
+            print(f'  {name}: {formatClock(clock.remaining(player))} left, {used:.1f}s searching, '
+                  f'{stats["over"]}/{stats["moves"]} moves over, overshoot mean {stats["mean"]:.1f}ms '
+                  f'p95 {stats["p95"]:.1f}ms max {stats["max"]:.1f}ms')
@@ -0,0 +1,227 @@
+import struct
+
+# ===== RECORD FORMAT =====
+#
+# A record file is just records written one after the other, no file header,
+# so files can be appended to and concatenated with `cat`.
+#
+# Each record is:
+#   header  : magic 'OR', version, flags, first player, result, move count
+#   moves   : one byte per ply, square = row * 8 + col, PASS = 64
+#   scores  : (only if FLAG_SCORES) one signed 16 bit engine score per ply
+#
+# Players use the same values as the game (1 = white, -1 = black).
+
+MAGIC = b'OR'
+VERSION = 1
+FLAG_SCORES = 1
+PASS = 64
+NO_RESULT = -128
+HEADER = struct.Struct('<2sBBbbH')
+BUFFER_SIZE = 1 << 20
+
+COLUMNS = 'abcdefgh'
+
+
+def moveToText(move):
+    """Convert a (row, col) move, or None for a pass, to text such as 'f5'"""
+    if move is None:
+        return '--'
+    return COLUMNS[move[1]] + str(move[0] + 1)
+
+
+def textToMove(text):
+    """Convert text such as 'f5' (or '--' for a pass) to a (row, col) move"""
+    text = text.lower()
+    if text in ('--', 'pa', 'ps'):
+        return None
+    if len(text) != 2 or text[0] not in COLUMNS or text[1] not in '12345678':
+        raise ValueError(f'bad move {text!r}')
+    return int(text[1]) - 1, COLUMNS.index(text[0])
+
+
+def movesToText(moves):
+    return ''.join(moveToText(move) for move in moves)
+
+
+def textToMoves(text):
+    text = ''.join(text.split())
+    if len(text) % 2:
+        raise ValueError(f'bad move list {text!r}')
+    return [textToMove(text[i:i + 2]) for i in range(0, len(text), 2)]
+
+
+class GameRecord:
+    """One game: the moves played, the final result and optional engine scores
+
+    # WHAT IT HOLDS:
+    # - moves: list of (row, col) tuples, None for a pass
+    # - firstPlayer: who made the first move (1 = white, -1 = black)
+    # - result: final disc difference, white minus black (None if unknown)
+    # - scores: list of engine scores, one per move, from the point of view of
+    #   the side making that move (None if not recorded)
+    """
+
+    __slots__ = ('moves', 'firstPlayer', 'result', 'scores')
+
+    def __init__(self, moves=None, firstPlayer=1, result=None, scores=None):
+        self.moves = list(moves) if moves is not None else []
+        self.firstPlayer = firstPlayer
+        self.result = result
+        self.scores = list(scores) if scores is not None else None
+
+    def __eq__(self, other):
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return (self.moves == other.moves and self.firstPlayer == other.firstPlayer
+                and self.result == other.result and self.scores == other.scores)
+
+    def __repr__(self):
+        return f'GameRecord({self.toText()!r}, firstPlayer={self.firstPlayer}, result={self.result})'
+
+    def toText(self):
+        return movesToText(self.moves)
+
+    @classmethod
+    def fromText(cls, text, firstPlayer=1, result=None):
+        return cls(textToMoves(text), firstPlayer, result)
+
+    def toBytes(self):
+        if self.scores is not None and len(self.scores) != len(self.moves):
+            raise ValueError('need exactly one score per move')
+        flags = FLAG_SCORES if self.scores is not None else 0
+        result = NO_RESULT if self.result is None else self.result
+        data = bytearray(HEADER.pack(MAGIC, VERSION, flags, self.firstPlayer, result, len(self.moves)))
+        data += bytes(PASS if move is None else move[0] * 8 + move[1] for move in self.moves)
+        if self.scores is not None:
+            data += struct.pack(f'<{len(self.scores)}h', *self.scores)
+        return bytes(data)
+
+
+def _recordSize(flags, count):
+    return HEADER.size + count + (2 * count if flags & FLAG_SCORES else 0)
+
+
+def _parseRecord(buffer, offset):
+    """Parse the record starting at `offset`, return (record, next offset) or (None, offset) if incomplete"""
+    if len(buffer) - offset < HEADER.size:
+        return None, offset
+    magic, version, flags, firstPlayer, result, count = HEADER.unpack_from(buffer, offset)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'not a game record at byte {offset}')
+    end = offset + _recordSize(flags, count)
+    if len(buffer) < end:
+        return None, offset
+    start = offset + HEADER.size
+    moves = [None if square == PASS else divmod(square, 8) for square in buffer[start:start + count]]
+    scores = None
+    if flags & FLAG_SCORES:
+        scores = list(struct.unpack_from(f'<{count}h', buffer, start + count))
+    return GameRecord(moves, firstPlayer, None if result == NO_RESULT else result, scores), end
+
+
+def readRecords(path, bufferSize=BUFFER_SIZE):
+    """Stream every GameRecord in a file without loading the whole file
+
+    # HOW IT WORKS:
+    # The file is read in big chunks. Complete records are parsed out of the
+    # chunk and handed out one at a time; any half record left at the end of a
+    # chunk is kept and joined with the next chunk.
+    """
+    buffer = bytearray()
+    offset = 0
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(bufferSize)
+            if not chunk:
+                break
+            del buffer[:offset]
+            buffer += chunk
+            offset = 0
+            while True:
+                record, offset = _parseRecord(buffer, offset)
+                if record is None:
+                    break
+                yield record
+    if offset != len(buffer):
+        raise ValueError(f'{path}: truncated record at end of file')
+
+
+class GameRecordWriter:
+    """Append GameRecords to a file, buffering them so the disk sees few large writes
+
+    Use as a context manager so the buffer is always flushed:
+
+        with GameRecordWriter('games.rec') as writer:
+            writer.write(record)
+    """
+
+    def __init__(self, path, append=True, bufferSize=BUFFER_SIZE):
+        self.file = open(path, 'ab' if append else 'wb')
+        self.bufferSize = bufferSize
+        self.buffer = bytearray()
+        self.count = 0
+
+    def write(self, record):
+        self.buffer += record.toBytes()
+        self.count += 1
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    def writeAll(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def textFileToRecords(textPath, recordPath, firstPlayer=1):
+    """Convert a text file with one game per line ('f5d6c3...', optional result after a space) to records"""
+    with GameRecordWriter(recordPath, append=False) as writer:
+        with open(textPath) as file:
+            for line in file:
+                parts = line.split()
+                if not parts:
+                    continue
+                result = int(parts[1]) if len(parts) > 1 else None
+                writer.write(GameRecord.fromText(parts[0], firstPlayer, result))
+        return writer.count
+
+
+def recordsToTextFile(recordPath, textPath):
+    count = 0
+    with open(textPath, 'w') as file:
+        for record in readRecords(recordPath):
+            line = record.toText()
+            if record.result is not None:
+                line += f' {record.result}'
+            file.write(line + '\n')
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 4 or sys.argv[1] not in ('totext', 'fromtext'):
+        print('usage: python game_record.py totext|fromtext <input> <output>')
+        sys.exit(1)
+    if sys.argv[1] == 'totext':
+        print(f'{recordsToTextFile(sys.argv[2], sys.argv[3])} games written')
+    else:
+        print(f'{textFileToRecords(sys.argv[2], sys.argv[3])} games written')
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import collections
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import othello_logic
+from computer_player import ComputerPlayer
+from difficulty import PROFILES, LevelPlayer
+from game_record import moveToText, textToMove
+
+# ===== PROTOCOL =====
+#
+# One command per line, one reply line per command. Each connection is one
+# game session with its own board.
+#
+#   NEW [white|black]  start a new game, the given side moves first  -> OK
+#   MOVE f5            play a move for the side to move             -> OK | ERR ...
+#   PASS               pass (only allowed with no legal moves)      -> OK | ERR ...
+#   STATE              -> STATE <64 cells W/B/.> <W|B|-> <legal moves or ->
+#   AI [ms|level]      engine plays for the side to move            -> MOVE f5 <score> <depth> <nodes>
+#                      with a time budget, or a difficulty level from difficulty.PROFILES
+#                      -> ERR bad budget | ERR engine failure (the search process failed)
+#   STATS              server throughput and AI latency percentiles
+#   QUIT               close the session
+
+CELLS = {1: 'W', -1: 'B', 0: '.'}
+SIDES = {1: 'W', -1: 'B'}
+
+_engine = None
+_levels = {}
+_stopEvent = None
+
+
+def _startWorker(stopEvent):
+    """Pool initializer: keep the server's stop event so searches end when it is set"""
+    global _stopEvent
+    _stopEvent = stopEvent
+
+
+def _searchWorker(grid, player, budget, maxDepth, level=None):
+    """Runs inside a pool process, the engine objects are kept for the life of the process"""
+    global _engine
+    if level is not None:
+        if level not in _levels:
+            _levels[level] = LevelPlayer(level)
+            _levels[level].engine.stopCheck = _stopEvent.is_set
+        return _levels[level].search(grid, player)
+    if _engine is None:
+        _engine = ComputerPlayer()
+        _engine.stopCheck = _stopEvent.is_set
+    return _engine.computerTimed(grid, player, budget, maxDepth)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Session:
+    """Board state for one connected game"""
+
+    def __init__(self, firstPlayer=1):
+        self.reset(firstPlayer)
+
+    def reset(self, firstPlayer=1):
+        self.grid = othello_logic.startGrid()
+        self.currentPlayer = firstPlayer
+        self.gameOver = False
+
+    def legalMoves(self):
+        if self.gameOver:
+            return []
+        return othello_logic.findAvailMoves(self.grid, self.currentPlayer)
+
+    def play(self, move):
+        if self.gameOver:
+            raise ValueError('game over')
+        if move is None:
+            if self.legalMoves():
+                raise ValueError('pass not allowed')
+        else:
+            if move not in self.legalMoves():
+                raise ValueError('illegal move')
+            othello_logic.applyMove(self.grid, move, self.currentPlayer)
+        self.currentPlayer *= -1
+        if not self.legalMoves():
+            if othello_logic.findAvailMoves(self.grid, -self.currentPlayer):
+                self.currentPlayer *= -1
+            else:
+                self.gameOver = True
+
+    def state(self):
+        board = ''.join(CELLS[cell] for row in self.grid for cell in row)
+        side = '-' if self.gameOver else SIDES[self.currentPlayer]
+        moves = ','.join(moveToText(move) for move in self.legalMoves()) or '-'
+        return f'STATE {board} {side} {moves}'
+
+
+class GameServer:
+    """Asyncio TCP server hosting many sessions that share one pool of engine processes
+
+    # HOW IT WORKS:
+    # Every connection gets its own Session. AI requests are sent to a
+    # ProcessPoolExecutor so searches run on other cores and never block the
+    # event loop. At most `workers * queueDepth` searches may be in flight;
+    # a request that cannot get a slot within `queueTimeout` seconds is
+    # answered with 'ERR busy' instead of piling up.
+    # On close the pool's stop event is set, so searches still running in
+    # the workers return within a few thousand nodes, queued ones are
+    # dropped and the worker processes exit before close returns.
+    # A search that raises, or a worker process that dies, is answered
+    # with 'ERR engine failure'; a pool broken by a dead worker is replaced
+    # so later requests get a working one.
+    """
+
+    def __init__(self, workers=2, queueDepth=2, queueTimeout=5.0, defaultBudget=0.2, maxBudget=5.0, maxDepth=8):
+        self.workers = workers
+        self.pool = None
+        self.stopEvent = multiprocessing.Event()
+        self.slots = asyncio.Semaphore(workers * queueDepth)
+        self.queueTimeout = queueTimeout
+        self.defaultBudget = defaultBudget
+        self.maxBudget = maxBudget
+        self.maxDepth = maxDepth
+        self.server = None
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.aiRequests = 0
+        self.rejected = 0
+        self.latencies = collections.deque(maxlen=10000)
+
+    async def start(self, host='127.0.0.1', port=7777):
+        self.stopEvent.clear()
+        self.pool = self.newPool()
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.started = time.perf_counter()
+        return self.server.sockets[0].getsockname()[1]
+
+    def newPool(self):
+        return ProcessPoolExecutor(self.workers, initializer=_startWorker, initargs=(self.stopEvent,))
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.stopEvent.set()
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = list(self.latencies)
+        return (f'STATS requests={self.requests} ai={self.aiRequests} rejected={self.rejected} '
+                f'rps={self.requests / elapsed:.1f} ai_per_s={self.aiRequests / elapsed:.2f} '
+                f'p50={percentile(latencies, 0.50) * 1000:.1f}ms p95={percentile(latencies, 0.95) * 1000:.1f}ms '
+                f'p99={percentile(latencies, 0.99) * 1000:.1f}ms')
+
+    async def aiMove(self, session, budget, level=None):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queueTimeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return 'ERR busy'
+        pool = self.pool
+        try:
+            loop = asyncio.get_running_loop()
+            grid = [row[:] for row in session.grid]
+            move, score, depth, nodes = await loop.run_in_executor(
+                pool, _searchWorker, grid, session.currentPlayer, budget, self.maxDepth, level)
+        except BrokenProcessPool:
+            # every request on the broken pool fails the same way; the first to get here replaces it
+            if self.pool is pool:
+                self.pool = self.newPool()
+                pool.shutdown(wait=False, cancel_futures=True)
+            return 'ERR engine failure'
+        except Exception:
+            return 'ERR engine failure'
+        finally:
+            self.slots.release()
+        self.aiRequests += 1
+        self.latencies.append(time.perf_counter() - start)
+        session.play(move)
+        return f'MOVE {moveToText(move)} {score} {depth} {nodes}'
+
+    async def command(self, session, line):
+        parts = line.split()
+        if not parts:
+            return 'ERR empty command'
+        name, args = parts[0].upper(), parts[1:]
+        try:
+            if name == 'NEW':
+                first = -1 if args and args[0].lower().startswith('b') else 1
+                session.reset(first)
+                return 'OK'
+            if name == 'MOVE' and len(args) == 1:
+                session.play(textToMove(args[0]))
+                return 'OK'
+            if name == 'PASS':
+                session.play(None)
+                return 'OK'
+            if name == 'STATE':
+                return session.state()
+            if name == 'AI':
+                if not session.legalMoves():
+                    return 'ERR no legal moves'
+                if args and args[0].lower() in PROFILES:
+                    return await self.aiMove(session, None, args[0].lower())
+                budget = float(args[0]) / 1000 if args else self.defaultBudget
+                if not math.isfinite(budget) or budget <= 0:
+                    return 'ERR bad budget'
+                return await self.aiMove(session, min(budget, self.maxBudget))
+            if name == 'STATS':
+                return self.stats()
+        except ValueError as error:
+            return f'ERR {error}'
+        return f'ERR unknown command {line.strip()!r}'
+
+    async def handle(self, reader, writer):
+        session = Session()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode(errors='replace').strip()
+                if line.upper() == 'QUIT':
+                    break
+                self.requests += 1
+                reply = await self.command(session, line)
+                writer.write(reply.encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _benchClient(port, aiMoves, budgetMs, level=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+    async def send(line):
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+        return (await reader.readline()).decode().strip()
+
+    await send('NEW')
+    for _ in range(aiMoves):
+        state = (await send('STATE')).split()
+        if state[2] == '-':
+            break
+        await send(f'AI {level or budgetMs}')
+    writer.write(b'QUIT\n')
+    await writer.drain()
+    writer.close()
+
+
+async def runBenchmark(sessions=16, aiMoves=10, budgetMs=50, workers=2, level=None):
+    """Start a server on a free localhost port, drive `sessions` concurrent games and return its stats line"""
+    server = GameServer(workers=workers)
+    port = await server.start(port=0)
+    try:
+        await asyncio.gather(*(_benchClient(port, aiMoves, budgetMs, level) for _ in range(sessions)))
+        return server.stats()
+    finally:
+        await server.close()
+
+
+async def _serve(args):
+    server = GameServer(workers=args.workers, defaultBudget=args.budget / 1000)
+    port = await server.start(args.host, args.port)
+    print(f'Othello server listening on {args.host}:{port}')
+    async with server.server:
+        await server.server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Othello multi-game server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--budget', type=float, default=200, help='default AI time per move in ms')
+    parser.add_argument('--bench', type=int, metavar='SESSIONS', help='run a localhost load test instead of serving')
+    parser.add_argument('--level', choices=sorted(PROFILES), help='difficulty level the load test plays at')
+    args = parser.parse_args()
+    if args.bench:
+        print(asyncio.run(runBenchmark(args.bench, workers=args.workers, level=args.level)))
+    else:
+        asyncio.run(_serve(args))
@@ -0,0 +1,143 @@
+import os
+import struct
+import zlib
+
+# ===== LINE TABLES =====
+#
+# Every row, column and diagonal is read as one line of up to 8 cells.
+# A line's contents relative to the player to move is a number in base 3
+# (cell i counts 3**i times: 0 empty, 1 own disc, 2 opponent disc), with
+# shorter diagonals padded with empty cells, so there are 3**8 = 6561
+# configurations. For each one the tables hold:
+#   FLIPS[config * 8 + pos]: bit mask of the line positions a disc placed
+#     at `pos` would flip
+#   LEGAL[config]: bit mask of the empty positions where a disc would flip
+#     something along this line
+# Building them takes a fraction of a second, so they are cached in
+# TABLE_PATH and only rebuilt when the file is missing or fails its check.
+#
+# File layout: HEADER (magic, version, crc32 of the rest) then FLIPS then LEGAL.
+
+CONFIGS = 3 ** 8
+MAGIC = b'OLT1'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'line_tables.bin')
+
+
+def _lines():
+    rows = [[row * 8 + col for col in range(8)] for row in range(8)]
+    columns = [[row * 8 + col for row in range(8)] for col in range(8)]
+    diagonals = [[row * 8 + row + start for row in range(8) if 0 <= row + start < 8] for start in range(-7, 8)]
+    antiDiagonals = [[row * 8 + start - row for row in range(8) if 0 <= start - row < 8] for start in range(15)]
+    return [line for line in rows + columns + diagonals + antiDiagonals if len(line) >= 3]
+
+
+# LINES[i] is the squares of line i; SQUARE_LINES[square] the (line, position) pairs through it
+LINES = _lines()
+SQUARE_LINES = [[] for _ in range(64)]
+for _index, _line in enumerate(LINES):
+    for _position, _square in enumerate(_line):
+        SQUARE_LINES[_square].append((_index, _position))
+# LINE_CELLS[i] is (row, col, 3 ** position) for each cell of line i
+LINE_CELLS = [tuple((square >> 3, square & 7, 3 ** position) for position, square in enumerate(line)) for line in LINES]
+LINE_MASKS = [(1 << len(line)) - 1 for line in LINES]
+POWERS = [3 ** position for position in range(8)]
+# POSITIONS[mask] lists the set bit positions of an 8 bit mask
+POSITIONS = [tuple(position for position in range(8) if mask >> position & 1) for mask in range(256)]
+
+
+def buildTables():
+    """Compute (FLIPS, LEGAL) as bytes"""
+    flips = bytearray(CONFIGS * 8)
+    legal = bytearray(CONFIGS)
+    for config in range(CONFIGS):
+        cells = [config // 3 ** position % 3 for position in range(8)]
+        for position in range(8):
+            mask = 0
+            for step in (-1, 1):
+                run = 0
+                cursor = position + step
+                while 0 <= cursor < 8 and cells[cursor] == 2:
+                    run |= 1 << cursor
+                    cursor += step
+                if run and 0 <= cursor < 8 and cells[cursor] == 1:
+                    mask |= run
+            flips[config * 8 + position] = mask
+            if mask and cells[position] == 0:
+                legal[config] |= 1 << position
+    return bytes(flips), bytes(legal)
+
+
+def loadTables(path=TABLE_PATH):
+    """Return (FLIPS, LEGAL) from the cache file, rebuilding and rewriting it if it is missing or damaged"""
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, checksum = HEADER.unpack_from(data)
+        payload = data[HEADER.size:]
+        if magic == MAGIC and version == VERSION and zlib.crc32(payload) == checksum \
+                and len(payload) == CONFIGS * 9:
+            return payload[:CONFIGS * 8], payload[CONFIGS * 8:]
+    except (OSError, struct.error):
+        pass
+    flips, legal = buildTables()
+    payload = flips + legal
+    # written to a temporary file and renamed over the cache, so a process
+    # loading it at the same moment sees the old file or the new one, never half of one
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, zlib.crc32(payload)) + payload)
+        os.replace(temporary, path)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+    return flips, legal
+
+
+FLIPS, LEGAL = loadTables()
+
+
+def flippedTiles(x, y, grid, player):
+    """(row, col) of every disc a move at (x, y) would flip, one table lookup per line"""
+    tiles = []
+    for index, position in SQUARE_LINES[x * 8 + y]:
+        config = 0
+        for row, col, weight in LINE_CELLS[index]:
+            cell = grid[row][col]
+            if cell:
+                config += weight if cell == player else weight + weight
+        mask = FLIPS[config * 8 + position]
+        if mask:
+            line = LINES[index]
+            for flipped in POSITIONS[mask]:
+                square = line[flipped]
+                tiles.append((square >> 3, square & 7))
+    return tiles
+
+
+def legalSquares(grid, player):
+    """Bit mask (bit row * 8 + col) of the legal moves for `player`
+
+    Each cell is read once to build all the line configurations, then
+    every line contributes its LEGAL entry.
+    """
+    configs = [0] * len(LINES)
+    for row, cells in enumerate(grid):
+        for col, cell in enumerate(cells):
+            if cell:
+                code = 1 if cell == player else 2
+                for index, position in SQUARE_LINES[row * 8 + col]:
+                    configs[index] += code * POWERS[position]
+    moves = 0
+    for index, config in enumerate(configs):
+        # positions past the end of a short diagonal are padding, never moves
+        mask = LEGAL[config] & LINE_MASKS[index]
+        if mask:
+            line = LINES[index]
+            for position in POSITIONS[mask]:
+                moves |= 1 << line[position]
+    return moves
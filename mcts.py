@@ -0,0 +1,271 @@
+import math
+import random
+import time
+
+import othello_logic
+from bitboard import legalMoves, flips, squares
+
+PASS = 64
+
+
+class Node:
+    """One position in the search tree
+
+    `mover`/`opponent` are the bitboards of the side to move (`player`) and
+    the other side. `wins` is counted for the player who made `move`, which
+    is the side that chooses this node during selection.
+    """
+
+    __slots__ = ('mover', 'opponent', 'player', 'move', 'parent', 'children', 'untried', 'visits', 'wins')
+
+    def setup(self, mover, opponent, player, move, parent):
+        self.mover = mover
+        self.opponent = opponent
+        self.player = player
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        moves = legalMoves(mover, opponent)
+        if not moves and legalMoves(opponent, mover):
+            moves = 1 << PASS
+        self.untried = moves
+        return self
+
+
+class MCTSPlayer:
+    """Monte Carlo Tree Search engine, a drop-in alternative to ComputerPlayer
+
+    # HOW IT WORKS:
+    # Instead of looking at every move to a fixed depth, it plays thousands of
+    # quick random games (playouts) and keeps statistics in a tree. UCT picks
+    # which branch to explore next, balancing moves that have won often with
+    # moves that have hardly been tried.
+    # The tree is kept between moves: when asked to move again it looks for
+    # the new position two plies down and continues from there. Nodes that
+    # are thrown away go back to a pool and are reused instead of allocated.
+    #
+    # computerHard takes the same arguments as ComputerPlayer.computerHard
+    # (depth, alpha and beta are ignored, the search runs for `budget`
+    # seconds or `iterations` playouts) and returns (move, score) with the
+    # score scaled to -64..64 from black's point of view.
+    """
+
+    def __init__(self, gridObject=None, budget=1.0, iterations=None, exploration=1.4, maxNodes=200000, seed=None):
+        self.grid = gridObject if gridObject is not None else othello_logic
+        self.budget = budget
+        self.iterations = iterations
+        self.exploration = exploration
+        self.maxNodes = maxNodes
+        self.random = random.Random(seed)
+        self.pool = []
+        self.allocated = 0
+        self.root = None
+        # tree nodes added and playouts run by the last search; playouts over the player's lifetime. Once
+        # the tree is full no nodes are added, so lastPlayouts is the measure of the work a search did
+        self.nodes = 0
+        self.lastPlayouts = 0
+        self.playouts = 0
+        # seconds the last search took after its loop (choosing the move, releasing the old tree),
+        # kept back from the next budget so the whole call fits in it
+        self.finishTime = 0.0
+        self.stopped = False
+
+    def newNode(self, mover, opponent, player, move, parent):
+        if self.pool:
+            node = self.pool.pop()
+        else:
+            node = Node()
+            self.allocated += 1
+        return node.setup(mover, opponent, player, move, parent)
+
+    def release(self, node):
+        """Return a whole subtree to the pool"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children)
+            node.children = []
+            node.parent = None
+            self.pool.append(node)
+
+    def findRoot(self, mover, opponent, player):
+        """Reuse the subtree for this position if it is within two plies of the old root"""
+        old = self.root
+        self.root = None
+        if old is not None:
+            candidates = [old]
+            for child in old.children:
+                candidates.append(child)
+                candidates.extend(child.children)
+            for node in candidates:
+                if node.mover == mover and node.opponent == opponent and node.player == player:
+                    if node.parent is not None:
+                        node.parent.children.remove(node)
+                        node.parent = None
+                    self.root = node
+                    break
+            if self.root is not old:
+                self.release(old)
+        if self.root is None:
+            self.root = self.newNode(mover, opponent, player, None, None)
+        return self.root
+
+    def play(self, node, move):
+        """Return (mover, opponent) of the child reached by `move` (already swapped for the next player)"""
+        if move == PASS:
+            return node.opponent, node.mover
+        flipped = flips(node.mover, node.opponent, move)
+        return node.opponent & ~flipped, node.mover | flipped | (1 << move)
+
+    def select(self, node):
+        logVisits = math.log(node.visits)
+        exploration = self.exploration
+        best, bestValue = None, -1.0
+        for child in node.children:
+            value = child.wins / child.visits + exploration * math.sqrt(logVisits / child.visits)
+            if value > bestValue:
+                best, bestValue = child, value
+        return best
+
+    def playout(self, mover, opponent, player):
+        """Play random moves to the end, return the winner (1, -1 or 0)"""
+        choice = self.random.choice
+        passes = 0
+        while passes < 2:
+            moves = legalMoves(mover, opponent)
+            if moves:
+                passes = 0
+                move = choice(list(squares(moves)))
+                flipped = flips(mover, opponent, move)
+                mover, opponent = opponent & ~flipped, mover | flipped | (1 << move)
+            else:
+                passes += 1
+                mover, opponent = opponent, mover
+            player = -player
+        difference = mover.bit_count() - opponent.bit_count()
+        if difference == 0:
+            return 0
+        return player if difference > 0 else -player
+
+    def iterate(self, root):
+        node = root
+        while not node.untried and node.children:
+            node = self.select(node)
+        if node.untried and self.allocated - len(self.pool) < self.maxNodes:
+            moves = list(squares(node.untried))
+            move = self.random.choice(moves)
+            node.untried &= ~(1 << move)
+            mover, opponent = self.play(node, move)
+            child = self.newNode(mover, opponent, -node.player, move, node)
+            node.children.append(child)
+            node = child
+            self.nodes += 1
+        winner = self.playout(node.mover, node.opponent, node.player)
+        self.playouts += 1
+        self.lastPlayouts += 1
+        while node is not None:
+            node.visits += 1
+            if winner == -node.player:
+                node.wins += 1
+            elif winner == 0:
+                node.wins += 0.5
+            node = node.parent
+
+    def computerHard(self, grid, depth, alpha, beta, player):
+        # the budget covers the whole call, finding the root and releasing the old tree included
+        deadline = time.perf_counter() + self.budget - self.finishTime
+        # a stop meant for an earlier search must not cut this one short
+        self.stopped = False
+        self.nodes = 0
+        self.lastPlayouts = 0
+        mover, opponent = othello_logic.gridMasks(grid, player)
+        root = self.findRoot(mover, opponent, player)
+        moves = legalMoves(mover, opponent)
+        if not moves:
+            return None, self.evaluateBoard(grid, -1)
+        start = time.perf_counter()
+        count = 0
+        # the stop is checked after each iteration, so even a search stopped at once expands the root
+        while True:
+            self.iterate(root)
+            count += 1
+            if self.stopped:
+                break
+            if self.iterations is not None:
+                if count >= self.iterations:
+                    break
+            else:
+                # a clock read costs far less than a playout, so it is done every iteration; the search ends
+                # when another iteration of the average length so far would no longer fit in the budget
+                now = time.perf_counter()
+                if now + (now - start) / count >= deadline:
+                    break
+        finish = time.perf_counter()
+        if not root.children:
+            # the node pool is full and the root could not be expanded
+            return divmod(next(squares(moves)), 8), 0
+        best = max(root.children, key=lambda child: child.visits)
+        rate = best.wins / best.visits
+        # keep the chosen subtree as the new root for the next call
+        root.children.remove(best)
+        best.parent = None
+        self.release(root)
+        self.root = best
+        self.finishTime = time.perf_counter() - finish
+        return divmod(best.move, 8), round((2 * rate - 1) * 64 * -player)
+
+    def evaluateBoard(self, grid, player):
+        return othello_logic.discDifference(grid) * player
+
+
+def playMatch(games=10, budget=0.2, seed=0):
+    """Play MCTS against alpha-beta (ComputerPlayer.computerTimed) with the same time per move
+
+    Colours alternate each game. Returns (mcts wins, alpha-beta wins, draws, playouts per second).
+    """
+    from computer_player import ComputerPlayer
+
+    alphaBeta = ComputerPlayer()
+    mcts = MCTSPlayer(budget=budget, seed=seed)
+    results = [0, 0, 0]
+    playouts = 0
+    searchTime = 0.0
+    for game in range(games):
+        mctsSide = 1 if game % 2 == 0 else -1
+        mcts.root = None
+        grid = othello_logic.startGrid()
+        player = 1
+        passes = 0
+        while passes < 2:
+            if not othello_logic.findAvailMoves(grid, player):
+                passes += 1
+                player *= -1
+                continue
+            passes = 0
+            if player == mctsSide:
+                before = mcts.playouts
+                start = time.perf_counter()
+                move, _ = mcts.computerHard(grid, 0, None, None, player)
+                searchTime += time.perf_counter() - start
+                playouts += mcts.playouts - before
+            else:
+                move = alphaBeta.computerTimed(grid, player, budget)[0]
+            othello_logic.applyMove(grid, move, player)
+            player *= -1
+        difference = othello_logic.discDifference(grid) * mctsSide
+        results[0 if difference > 0 else 1 if difference < 0 else 2] += 1
+    return results[0], results[1], results[2], playouts / searchTime if searchTime else 0.0
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark MCTS against alpha-beta at equal time per move')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--time', type=float, default=200, help='time per move in ms')
+    args = parser.parse_args()
+    wins, losses, draws, rate = playMatch(args.games, args.time / 1000)
+    print(f'MCTS vs alpha-beta: {wins} wins, {losses} losses, {draws} draws '
+          f'(win rate {(wins + draws / 2) / args.games:.0%}), {rate:.0f} playouts/s')
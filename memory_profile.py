@@ -0,0 +1,165 @@
+import os
+import sys
+import tracemalloc
+
+# ===== MEMORY PROFILE REPORT =====
+#
+# A plain text file meant to be diffed between versions: the same game
+# profiled before and after a change lines up move by move.
+#   [moves]  one line per AI move: nodes searched, bytes allocated and
+#            freed again during the search (tracemalloc peak above the
+#            level at the start), bytes and blocks still held afterwards,
+#            and transient bytes per node
+#   [frames] the same for each sampled frame
+#   [sites]  the largest size each source line held at any of the
+#            snapshots taken after a move or frame, biggest first
+# Only memory allocated through Python's allocator is seen; SDL surfaces
+# and other C library memory are not. Memory a call frees before it
+# allocates (a transposition table cleared before the search) lowers the
+# starting level it is measured from, so such calls read low.
+
+# sites left out of the report: the profiler's and tracemalloc's own bookkeeping and the import machinery
+IGNORED = {os.path.basename(__file__), os.path.basename(tracemalloc.__file__), '<frozen importlib._bootstrap>',
+           '<frozen importlib._bootstrap_external>', '<unknown>'}
+
+
+class MemoryProfiler:
+    """Profiles AI moves and sampled frames with tracemalloc snapshots
+
+    # HOW IT WORKS:
+    # `record` runs one move or frame between two snapshots. The traced
+    # peak, reset just before, gives the memory allocated and released
+    # again during the call; comparing the snapshots gives what it kept.
+    # After every call the size held by each source line is compared with
+    # the largest seen so far, which is what the [sites] table reports.
+    # Tracing slows Python down several times over, so this is opt-in and
+    # timings taken while it runs mean nothing.
+    #
+    # WHAT IT HOLDS:
+    # moves, frames: one dict per recorded call
+    # sites: {'file:line': (largest size, blocks at that size)}
+    """
+
+    def __init__(self, top=30):
+        self.top = top
+        self.moves = []
+        self.frames = []
+        self.sites = {}
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def record(self, kind, label, call, nodes=None):
+        """Run `call()` as a 'move' or 'frame' and return its result; `nodes()` is read after a move"""
+        before = tracemalloc.take_snapshot()
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = call()
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        changes = after.compare_to(before, 'filename')
+        held = sum(stat.size_diff for stat in changes)
+        heldBlocks = sum(stat.count_diff for stat in changes)
+        entry = {'label': label, 'transient': peak - start, 'held': held, 'blocks': heldBlocks}
+        if kind == 'move':
+            entry['nodes'] = nodes() if nodes is not None else 0
+            self.moves.append(entry)
+        else:
+            self.frames.append(entry)
+        sites = self.sites
+        for stat in after.statistics('lineno'):
+            frame = stat.traceback[0]
+            filename = os.path.basename(frame.filename)
+            if filename in IGNORED:
+                continue
+            site = f'{filename}:{frame.lineno}'
+            if stat.size > sites.get(site, (0, 0))[0]:
+                sites[site] = (stat.size, stat.count)
+        return result
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            file.write('[moves]\n')
+            file.write(f'{"move":>5} {"label":8} {"nodes":>9} {"transient":>11} {"held":>10} {"blocks":>8} '
+                       f'{"bytes/node":>10}\n')
+            for index, entry in enumerate(self.moves, 1):
+                perNode = entry['transient'] / entry['nodes'] if entry['nodes'] else 0.0
+                file.write(f'{index:5} {entry["label"]:8} {entry["nodes"]:9} {entry["transient"]:11} '
+                           f'{entry["held"]:10} {entry["blocks"]:8} {perNode:10.1f}\n')
+            nodes = sum(entry['nodes'] for entry in self.moves)
+            transient = sum(entry['transient'] for entry in self.moves)
+            file.write(f'total {nodes} nodes, {transient / nodes if nodes else 0:.1f} transient bytes per node\n')
+            file.write('\n[frames]\n')
+            file.write(f'{"frame":>5} {"label":8} {"transient":>11} {"held":>10} {"blocks":>8}\n')
+            for index, entry in enumerate(self.frames, 1):
+                file.write(f'{index:5} {entry["label"]:8} {entry["transient"]:11} {entry["held"]:10} '
+                           f'{entry["blocks"]:8}\n')
+            if self.frames:
+                mean = sum(entry['transient'] for entry in self.frames) / len(self.frames)
+                file.write(f'mean {mean:.0f} transient bytes per frame\n')
+            file.write('\n[sites]\n')
+            ranked = sorted(self.sites.items(), key=lambda item: (-item[1][0], item[0]))
+            for site, (size, count) in ranked[:self.top]:
+                file.write(f'{size:12} {count:8} {site}\n')
+
+
+def profileGame(path, level='club', frameEvery=4, moves=20, seed=0):
+    """Profile an engine game at `level` (both sides), drawing a frame of every `frameEvery`th position
+
+    The game is reproducible for the node-limited levels, so two versions
+    of the code profile exactly the same searches.
+    """
+    import othello_logic
+    import render_bench
+    from difficulty import LevelPlayer
+
+    game, _ = render_bench.loadGame()
+    profiler = MemoryProfiler()
+    players = {1: LevelPlayer(level, seed=seed), -1: LevelPlayer(level, seed=seed + 1)}
+    grid = othello_logic.startGrid()
+    player = 1
+    profiler.start()
+    try:
+        for ply in range(moves):
+            if not othello_logic.findAvailMoves(grid, player):
+                player *= -1
+                if not othello_logic.findAvailMoves(grid, player):
+                    break
+            engine = players[player]
+            move, _ = profiler.record('move', 'white' if player == 1 else 'black',
+                                      lambda: engine.computerHard(grid, 0, None, None, player),
+                                      lambda: engine.nodes)
+            othello_logic.applyMove(grid, move, player)
+            player *= -1
+            if ply % frameEvery == 0:
+                for line, values in zip(game.grid.gridLogic, grid):
+                    line[:] = values
+                game.grid.frontier.reset(game.grid.gridLogic)
+                game.currentPlayer = player
+                profiler.record('frame', f'ply {ply + 1}', game.draw)
+    finally:
+        profiler.stop()
+        render_bench.pygame.quit()
+    profiler.write(path)
+    return profiler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Memory profile of an engine game and its frames')
+    parser.add_argument('output', help='report file to write')
+    parser.add_argument('--level', default='club')
+    parser.add_argument('--moves', type=int, default=20, help='plies to play; the full game takes minutes under tracing')
+    parser.add_argument('--frame-every', type=int, default=4)
+    args = parser.parse_args()
+    profiler = profileGame(args.output, args.level, args.frame_every, args.moves)
+    nodes = sum(entry['nodes'] for entry in profiler.moves)
+    print(f'{len(profiler.moves)} moves, {len(profiler.frames)} frames profiled into {args.output}', file=sys.stderr)
+    if nodes:
+        print(f'{sum(entry["transient"] for entry in profiler.moves) / nodes:.1f} transient bytes per node',
+              file=sys.stderr)
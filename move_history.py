@@ -0,0 +1,128 @@
+from bitboard import squares
+
+
+class Ply:
+    """One move in the game tree
+
+    `square` is row * 8 + col, `flipped` the bitboard of the discs it
+    turned over. `children` are the moves tried from the position after
+    this one; the first is the one `redo` follows.
+    """
+
+    __slots__ = ('square', 'player', 'flipped', 'parent', 'children')
+
+    def __init__(self, square, player, flipped, parent):
+        self.square = square
+        self.player = player
+        self.flipped = flipped
+        self.parent = parent
+        self.children = []
+
+    @property
+    def move(self):
+        return divmod(self.square, 8)
+
+
+class MoveHistory:
+    """Takeback, redo and variations for a game played on a `gridLogic` list
+
+    # HOW IT WORKS:
+    # Only the move and the mask of flipped discs are kept per ply, never a
+    # copy of the board. Taking a move back empties its square and turns
+    # the flipped discs back; redoing it does the opposite. Both touch only
+    # the squares that changed, however long the game or analysis session.
+    # Playing a move that differs from the one already stored after the
+    # current position starts a new variation next to it; the old line is
+    # kept and can be reached again with `switchVariation`.
+    # undo/redo return the bitboard of the squares they changed so the
+    # renderer can update just those.
+    """
+
+    def __init__(self):
+        self.root = Ply(None, None, 0, None)
+        self.current = self.root
+
+    def reset(self):
+        self.root.children = []
+        self.current = self.root
+
+    def record(self, move, player, flippedTiles):
+        """Add a move that has just been played on the board; an existing identical move is reused"""
+        square = move[0] * 8 + move[1]
+        node = self.current
+        for index, child in enumerate(node.children):
+            if child.square == square and child.player == player:
+                node.children.insert(0, node.children.pop(index))
+                self.current = child
+                return child
+        flipped = 0
+        for row, col in flippedTiles:
+            flipped |= 1 << (row * 8 + col)
+        child = Ply(square, player, flipped, node)
+        node.children.insert(0, child)
+        self.current = child
+        return child
+
+    def canUndo(self):
+        return self.current is not self.root
+
+    def canRedo(self):
+        return bool(self.current.children)
+
+    def undo(self, grid):
+        """Take back the current move, return the squares changed (0 if at the start)"""
+        ply = self.current
+        if ply is self.root:
+            return 0
+        row, col = divmod(ply.square, 8)
+        grid[row][col] = 0
+        for square in squares(ply.flipped):
+            grid[square >> 3][square & 7] = -ply.player
+        self.current = ply.parent
+        return ply.flipped | (1 << ply.square)
+
+    def redo(self, grid):
+        """Play the first stored move again, return the squares changed (0 if there is none)"""
+        if not self.current.children:
+            return 0
+        ply = self.current.children[0]
+        row, col = divmod(ply.square, 8)
+        grid[row][col] = ply.player
+        for square in squares(ply.flipped):
+            grid[square >> 3][square & 7] = ply.player
+        self.current = ply
+        return ply.flipped | (1 << ply.square)
+
+    def switchVariation(self, grid, step=1):
+        """Replace the current move with its next (step 1) or previous (step -1) sibling"""
+        ply = self.current
+        if ply is self.root or len(ply.parent.children) < 2:
+            return 0
+        siblings = ply.parent.children
+        changed = self.undo(grid)
+        # the current move is always first; rotating the list brings the next one to the front
+        if step > 0:
+            siblings.append(siblings.pop(0))
+        else:
+            siblings.insert(0, siblings.pop())
+        return changed | self.redo(grid)
+
+    def sideToMove(self, default):
+        """The player to move in the current position, `default` at the start of an empty history
+
+        A stored next move knows who played it, which covers passes; at the
+        end of the line it is the other side of the last move.
+        """
+        if self.current.children:
+            return self.current.children[0].player
+        return default if self.current is self.root else -self.current.player
+
+    def moves(self):
+        """The (row, col) moves from the start to the current position"""
+        moves = []
+        node = self.current
+        while node is not self.root:
+            moves.append(node.move)
+            node = node.parent
+        moves.reverse()
+        return moves
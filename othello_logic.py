@@ -1 +1,301 @@
+import random
+import struct
 
+import line_tables
+import symmetry
+from bitboard import squares
+
+# ===== BOARD RULES =====
+#
+# Headless version of the rules used by Grid, so tools (record replay,
+# analysis, the engine) can work on boards without pygame or a window.
+# Boards are the same list of lists as Grid.gridLogic: grid[row][col] is
+# 1 (white), -1 (black) or 0 (empty). Moves are (row, col) tuples.
+
+
+def directions(x, y, minX=0, minY=0, maxX=7, maxY=7):
+    validdirections = []
+    if x != minX: validdirections.append((x - 1, y))
+    if x != minX and y != minY: validdirections.append((x - 1, y - 1))
+    if x != minX and y != maxY: validdirections.append((x - 1, y + 1))
+    if x != maxX: validdirections.append((x + 1, y))
+    if x != maxX and y != minY: validdirections.append((x + 1, y - 1))
+    if x != maxX and y != maxY: validdirections.append((x + 1, y + 1))
+    if y != minY: validdirections.append((x, y - 1))
+    if y != maxY: validdirections.append((x, y + 1))
+    return validdirections
+
+
+def startGrid():
+    grid = [[0] * 8 for _ in range(8)]
+    grid[3][3] = 1
+    grid[3][4] = -1
+    grid[4][4] = 1
+    grid[4][3] = -1
+    return grid
+
+
+# ===== FRONTIER =====
+#
+# Every legal move is an empty square next to a disc. The GUI keeps that
+# set, the frontier, as a bitmask updated as discs are placed and taken
+# back, and looks for moves only there instead of on all 64 squares.
+
+# (row, col) of the neighbours of each square
+NEIGHBOUR_CELLS = [tuple(directions(square >> 3, square & 7)) for square in range(64)]
+NEIGHBOURS = [sum(1 << (row * 8 + col) for row, col in cells) for cells in NEIGHBOUR_CELLS]
+
+
+def _rays(square):
+    """(first cell, cells after it) walking from `square` to the edge in each direction that can hold a capture"""
+    row, col = square >> 3, square & 7
+    rays = []
+    for stepRow, stepCol in ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)):
+        cells = []
+        r, c = row + stepRow, col + stepCol
+        while 0 <= r < 8 and 0 <= c < 8:
+            cells.append((r, c))
+            r, c = r + stepRow, c + stepCol
+        # a capture needs an opponent disc and one of the mover's behind it
+        if len(cells) >= 2:
+            rays.append((cells[0], tuple(cells[1:])))
+    return tuple(rays)
+
+
+RAYS = [_rays(square) for square in range(64)]
+
+
+class Frontier:
+    """The empty squares next to at least one disc, as a bitmask (bit row * 8 + col)
+
+    # HOW IT WORKS:
+    # Placing a disc adds its empty neighbours and takes its own square
+    # out. Taking a disc away (a takeback) puts its square back if a
+    # neighbour is still occupied, and drops each empty neighbour that has
+    # no other disc next to it. Turning a disc over changes neither, so
+    # flips need no update. Each change touches at most 9 squares.
+    #
+    # WHAT IT HOLDS:
+    # squares: the frontier
+    # occupied: every square holding a disc
+    """
+
+    __slots__ = ('squares', 'occupied')
+
+    def __init__(self, grid=None):
+        self.reset(grid)
+
+    def reset(self, grid=None):
+        """Start again from the discs of `grid`, or from an empty board"""
+        self.squares = 0
+        self.occupied = 0
+        if grid is not None:
+            for row, cells in enumerate(grid):
+                for col, cell in enumerate(cells):
+                    if cell:
+                        self.place(row, col)
+
+    def place(self, row, col):
+        square = row * 8 + col
+        self.occupied |= 1 << square
+        self.squares = (self.squares | NEIGHBOURS[square]) & ~self.occupied
+
+    def remove(self, row, col):
+        square = row * 8 + col
+        occupied = self.occupied & ~(1 << square)
+        frontier = self.squares
+        if NEIGHBOURS[square] & occupied:
+            frontier |= 1 << square
+        for neighbour in squares(NEIGHBOURS[square] & ~occupied):
+            if not NEIGHBOURS[neighbour] & occupied:
+                frontier &= ~(1 << neighbour)
+        self.occupied = occupied
+        self.squares = frontier
+
+    def update(self, grid, changed):
+        """Catch up with the squares in the `changed` bitboard, set in `grid` behind its back (takeback, redo)"""
+        for square in squares(changed):
+            row, col = square >> 3, square & 7
+            if grid[row][col] and not self.occupied >> square & 1:
+                self.place(row, col)
+            elif not grid[row][col] and self.occupied >> square & 1:
+                self.remove(row, col)
+
+
+def findValidCells(grid, curPlayer, frontier=None):
+    """Empty squares next to a disc of the other side, the candidates for a move
+
+    Only the frontier is searched; without one it is built from `grid`.
+    """
+    if frontier is None:
+        frontier = Frontier(grid)
+    opponent = -curPlayer
+    validCellToClick = []
+    for square in squares(frontier.squares):
+        for row, col in NEIGHBOUR_CELLS[square]:
+            if grid[row][col] == opponent:
+                validCellToClick.append((square >> 3, square & 7))
+                break
+    return validCellToClick
+
+
+def swappableTiles(x, y, grid, player):
+    return line_tables.flippedTiles(x, y, grid, player)
+
+
+def findAvailMoves(grid, currentPlayer, frontier=None):
+    """Legal moves for `currentPlayer`, in square order
+
+    With a `frontier` kept up to date for `grid`, only its squares are
+    tried, each walking outwards until a direction proves a capture.
+    Without one, the whole board goes through the line tables.
+    """
+    playableCells = []
+    if frontier is None:
+        moves = line_tables.legalSquares(grid, currentPlayer)
+        while moves:
+            low = moves & -moves
+            square = low.bit_length() - 1
+            playableCells.append((square >> 3, square & 7))
+            moves ^= low
+        return playableCells
+    opponent = -currentPlayer
+    candidates = frontier.squares
+    while candidates:
+        low = candidates & -candidates
+        square = low.bit_length() - 1
+        candidates ^= low
+        # a frontier out of step with `grid` may miss moves, but must never offer an occupied square
+        if grid[square >> 3][square & 7]:
+            continue
+        for (row, col), rest in RAYS[square]:
+            if grid[row][col] != opponent:
+                continue
+            for row, col in rest:
+                cell = grid[row][col]
+                if cell != opponent:
+                    break
+            if cell == currentPlayer:
+                playableCells.append((square >> 3, square & 7))
+                break
+    return playableCells
+
+
+def applyMove(grid, move, player):
+    """Play `move` for `player` in place and return the list of flipped tiles"""
+    X, Y = move
+    tiles = swappableTiles(X, Y, grid, player)
+    if not tiles:
+        raise ValueError(f'illegal move {move} for player {player}')
+    grid[X][Y] = player
+    for tile in tiles:
+        grid[tile[0]][tile[1]] = player
+    return tiles
+
+
+def discDifference(grid):
+    """White discs minus black discs"""
+    return sum(sum(row) for row in grid)
+
+
+def replay(record):
+    """Walk through a GameRecord, yielding (grid, player, move) before each move is played
+
+    Passes recorded as None are yielded with move None. If the record skips a
+    forced pass the side with no moves passes automatically. The grid yielded
+    is the live board, copy it if it needs to be kept.
+    """
+    grid = startGrid()
+    player = record.firstPlayer
+    for move in record.moves:
+        if move is not None and not swappableTiles(move[0], move[1], grid, player) \
+                and not findAvailMoves(grid, player):
+            player *= -1
+        yield grid, player, move
+        if move is not None:
+            applyMove(grid, move, player)
+        player *= -1
+
+
+def randomPositions(count, plies=20, seed=0):
+    """Reproducible sample positions: `count` games of random moves, stopped after `plies` moves
+
+    Returns a list of (grid, player). Used by the benchmarks so every run
+    searches the same positions.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        grid = startGrid()
+        player = 1
+        for _ in range(plies):
+            moves = findAvailMoves(grid, player)
+            if not moves:
+                player *= -1
+                moves = findAvailMoves(grid, player)
+                if not moves:
+                    break
+            applyMove(grid, rng.choice(moves), player)
+            player *= -1
+        if findAvailMoves(grid, player):
+            positions.append((grid, player))
+    return positions
+
+
+# ===== POSITION TEXT =====
+#
+# A position as text is 64 cells (W, B or .) row by row from a1 to h8, a
+# space, then the side to move (W or B).
+
+CELL_TEXT = {1: 'W', -1: 'B', 0: '.'}
+TEXT_CELL = {'W': 1, 'B': -1, '.': 0, '-': 0}
+
+
+def positionToText(grid, player):
+    return ''.join(CELL_TEXT[cell] for row in grid for cell in row) + ' ' + CELL_TEXT[player]
+
+
+def textToPosition(text):
+    """Parse '<64 cells> <W|B>' into (grid, player)"""
+    parts = text.upper().split()
+    if len(parts) != 2 or len(parts[0]) != 64 or any(cell not in TEXT_CELL for cell in parts[0]):
+        raise ValueError('position needs 64 cells of W, B or . and a side to move')
+    if parts[1] not in ('W', 'B'):
+        raise ValueError('side must be W or B')
+    cells = parts[0]
+    grid = [[TEXT_CELL[cell] for cell in cells[row * 8:row * 8 + 8]] for row in range(8)]
+    return grid, TEXT_CELL[parts[1]]
+
+
+# ===== POSITION KEYS =====
+#
+# A position key is 16 bytes: the discs of the side to move and the discs of
+# the other side, as two 64 bit masks (bit row * 8 + col). Because the key is
+# relative to the side to move, the same shape reached by either colour gives
+# the same key.
+
+KEY = struct.Struct('<QQ')
+
+
+def gridMasks(grid, player):
+    """Return (mover, opponent) 64 bit masks for `player` to move"""
+    mover = opponent = 0
+    bit = 1
+    for row in grid:
+        for cell in row:
+            if cell == player:
+                mover |= bit
+            elif cell == -player:
+                opponent |= bit
+            bit <<= 1
+    return mover, opponent
+
+
+def canonicalKey(grid, player):
+    """Return (key, t): the smallest key over the 8 board symmetries and the symmetry used
+
+    A move `square` in the real board is `TRANSFORMS[t][square]` in the
+    canonical board, and `INVERSE[t][square]` maps back.
+    """
+    mover, opponent, t = symmetry.canonical(*gridMasks(grid, player))
+    return KEY.pack(mover, opponent), t
@@ -0,0 +1,102 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import othello_logic
+from computer_player import ComputerPlayer
+from transposition import SharedTranspositionTable
+
+_engine = None
+
+
+def _attach(name, stopEvent):
+    """Pool initializer: every worker process gets one engine on the shared table"""
+    global _engine
+    _engine = ComputerPlayer(table=SharedTranspositionTable.attach(name))
+    _engine.stopCheck = stopEvent.is_set
+    # helpers start from slightly different move orders so they do not all
+    # walk the tree in the same order and repeat each other's work
+    rng = random.Random(os.getpid())
+    for square in range(64):
+        _engine.moveOrder[square] += rng.randrange(4)
+
+
+def _searchWorker(grid, player, budget, maxDepth, nodeLimit):
+    return _engine.computerTimed(grid, player, budget, maxDepth, nodeLimit=nodeLimit)
+
+
+class LazySMP:
+    """Parallel search: several processes search the same position and share one transposition table
+
+    # HOW IT WORKS:
+    # No work is split up explicitly. Every worker runs the ordinary
+    # iterative deepening on the same position, but all of them read and
+    # write one SharedTranspositionTable, so a subtree finished by one
+    # worker is a table hit for the others. Because the workers order moves
+    # a little differently they soon drift to different parts of the tree,
+    # and together they finish each depth sooner than one process would.
+    # The answer is taken from the worker that finished the deepest
+    # iteration. Memory is the table (`tableBytes`) plus one engine per
+    # worker, whatever the number of workers.
+    """
+
+    def __init__(self, workers=None, tableBytes=64 << 20):
+        self.workers = workers or os.cpu_count() or 1
+        self.table = SharedTranspositionTable(tableBytes)
+        self.stopEvent = multiprocessing.Event()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_attach, initargs=(self.table.name, self.stopEvent))
+
+    def search(self, grid, player, budget=None, maxDepth=60, nodeLimit=None):
+        """Return (move, score for black, depth, total nodes) like ComputerPlayer.computerTimed
+
+        Needs a time `budget` or `nodeLimit` (per worker), or a `maxDepth`
+        small enough to finish; workers are only interrupted by close().
+        """
+        self.table.newGeneration()
+        futures = [self.pool.submit(_searchWorker, grid, player, budget, maxDepth, nodeLimit)
+                   for _ in range(self.workers)]
+        results = [future.result() for future in futures]
+        move, score, depth, _ = max(results, key=lambda result: result[2])
+        return move, score, depth, sum(result[3] for result in results)
+
+    def computerHard(self, grid, depth, alpha, beta, player):
+        move, score, _, _ = self.search(grid, player, maxDepth=depth)
+        return move, score
+
+    def close(self):
+        # searches still running see the event within a few thousand nodes and return
+        self.stopEvent.set()
+        self.pool.shutdown(cancel_futures=True)
+        self.table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lazy SMP search on sample positions')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--positions', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=6)
+    args = parser.parse_args()
+    samples = othello_logic.randomPositions(args.positions, 20)
+    single = ComputerPlayer()
+    start = time.perf_counter()
+    for grid, player in samples:
+        single.reset()
+        single.computerTimed(grid, player, None, args.depth)
+    serial = time.perf_counter() - start
+    with LazySMP(args.workers) as smp:
+        start = time.perf_counter()
+        for grid, player in samples:
+            smp.table.clear()
+            smp.search(grid, player, maxDepth=args.depth)
+        parallel = time.perf_counter() - start
+    print(f'depth {args.depth}: 1 process {serial:.2f}s, {smp.workers} workers {parallel:.2f}s '
+          f'(speedup {serial / parallel:.2f}x)')
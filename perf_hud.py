@@ -0,0 +1,110 @@
+import time
+from collections import deque
+
+# ===== PERFORMANCE HUD =====
+#
+# Frame phases, in the order the run loop goes through them. 'animate' is
+# the flip animations, which draw their own frames from inside input or
+# update; their time is taken out of the phase they ran in.
+PHASES = ('input', 'update', 'animate', 'draw')
+
+
+def percentile(ordered, fraction):
+    """Value `fraction` of the way up the sorted list `ordered`"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class PerfHud:
+    """Frame time and engine statistics shown in the side panel
+
+    # HOW IT WORKS:
+    # While `visible`, the game loop calls `beginFrame`, `phase` after each
+    # of input, update and draw, and `endFrame`; each call is one
+    # perf_counter read. When the overlay is off the loop makes none of
+    # these calls, so nothing is measured and nothing costs anything.
+    # `animate` runs a flip animation and books its time under 'animate',
+    # moving the phase mark past it so input or update do not count it twice.
+    # The search thread reports every finished search to `searched`.
+    # The text is rendered again only every `refresh` seconds, so the
+    # overlay is readable and adds little to the draw time it reports.
+    #
+    # WHAT IT HOLDS:
+    # frames: the last `samples` frame times in seconds
+    # phases: {phase: the last `samples` times spent in it}
+    # current: {phase: seconds} of the frame being measured
+    # lastSearch: (depth or None, work, unit, seconds) of the last AI search,
+    #   work counted in nodes for alpha-beta and in playouts for MCTS
+    """
+
+    def __init__(self, samples=240, refresh=0.25):
+        self.visible = False
+        self.refresh = refresh
+        self.frames = deque(maxlen=samples)
+        self.phases = {name: deque(maxlen=samples) for name in PHASES}
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.frameStart = self.mark = 0.0
+        self.lastSearch = None
+        self.lines = []
+        self.rendered = 0.0
+
+    def toggle(self):
+        self.visible = not self.visible
+        # statistics from before the overlay was switched off would mix with the new ones
+        self.frames.clear()
+        for times in self.phases.values():
+            times.clear()
+        self.rendered = 0.0
+
+    def beginFrame(self):
+        self.frameStart = self.mark = time.perf_counter()
+        self.current = dict.fromkeys(PHASES, 0.0)
+
+    def phase(self, name):
+        """The phase `name` ends now"""
+        now = time.perf_counter()
+        self.current[name] += now - self.mark
+        self.mark = now
+
+    def animate(self, call):
+        start = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - start
+        self.current['animate'] += elapsed
+        self.mark += elapsed
+
+    def endFrame(self):
+        self.frames.append(time.perf_counter() - self.frameStart)
+        for name, seconds in self.current.items():
+            self.phases[name].append(seconds)
+
+    def searched(self, depth, work, seconds, unit='nodes'):
+        self.lastSearch = (depth, work, unit, seconds)
+
+    def text(self):
+        """Lines of the overlay"""
+        lines = []
+        if self.frames:
+            ordered = sorted(self.frames)
+            mean = sum(ordered) / len(ordered)
+            lines.append(f'{1 / mean:.0f} fps, {len(ordered)} frames' if mean else f'{len(ordered)} frames')
+            lines.append(f'p50 {percentile(ordered, 0.5) * 1000:.1f} p95 {percentile(ordered, 0.95) * 1000:.1f} ms')
+            lines.append(f'p99 {percentile(ordered, 0.99) * 1000:.1f} max {ordered[-1] * 1000:.1f} ms')
+            for name in PHASES:
+                times = self.phases[name]
+                lines.append(f'{name} {sum(times) / len(times) * 1000:.2f} ms')
+        if self.lastSearch is not None:
+            depth, work, unit, seconds = self.lastSearch
+            lines.append(f'AI depth {depth if depth is not None else "-"}')
+            lines.append(f'{work:,} {unit}')
+            lines.append(f'{work / seconds if seconds else 0:,.0f} {unit}/s')
+        return lines
+
+    def draw(self, window, font, origin):
+        now = time.perf_counter()
+        if now - self.rendered >= self.refresh:
+            self.rendered = now
+            self.lines = [font.render(line, True, 'White', 'Black') for line in self.text()]
+        x, y = origin
+        for line in self.lines:
+            window.blit(line, (x, y))
+            y += line.get_height()
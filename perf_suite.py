@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import othello_logic
+from bitboard import legalMoves, flips, squares
+from computer_player import ComputerPlayer
+from evaluation import Evaluator
+
+# ===== PERFORMANCE REGRESSION SUITE =====
+#
+# Each benchmark is run `repeats` times and every sample is kept. Results
+# are stored in BASELINE_PATH under a fingerprint of the machine (CPU,
+# core count, OS, Python build), because timings only compare on the same
+# hardware:
+#   {fingerprint: {'machine': {...}, 'saved': time, 'results': {name: {'unit', 'higher', 'samples'}}}}
+# A new run is compared benchmark by benchmark with the baseline of the
+# machine it runs on. A change counts as a regression only when it is both
+#   large: the mean moved the wrong way by more than `tolerance`, and
+#   significant: the difference of the means is more than `sigmas`
+#     standard errors (Welch), so ordinary run to run noise is not flagged.
+# The command exits with status 1 when any benchmark regressed, and then
+# --save keeps the old baseline unless --accept-regressions is given.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baselines.json')
+# Move generation counts from the start position (passes count as a ply)
+PERFT_COUNTS = [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288]
+
+
+def perft(grid, player, depth, passed=False):
+    """Leaf count of the move tree `depth` plies deep, on the list board (swappableTiles path)"""
+    if depth == 0:
+        return 1
+    moves = othello_logic.findAvailMoves(grid, player)
+    if not moves:
+        if passed:
+            return 1
+        return perft(grid, -player, depth - 1, True)
+    total = 0
+    for move in moves:
+        child = [row[:] for row in grid]
+        othello_logic.applyMove(child, move, player)
+        total += perft(child, -player, depth - 1)
+    return total
+
+
+def bitboardPerft(mover, opponent, depth, passed=False):
+    """perft on bitboards, the move generator the search uses"""
+    if depth == 0:
+        return 1
+    moves = legalMoves(mover, opponent)
+    if not moves:
+        if passed:
+            return 1
+        return bitboardPerft(opponent, mover, depth - 1, True)
+    total = 0
+    for square in squares(moves):
+        flipped = flips(mover, opponent, square)
+        total += bitboardPerft(opponent & ~flipped, mover | flipped | (1 << square), depth - 1)
+    return total
+
+
+def frontierPerft(grid, player, depth, frontier, passed=False):
+    """perft on the list board with moves from an incrementally kept Frontier, the path the GUI uses"""
+    if depth == 0:
+        return 1
+    moves = othello_logic.findAvailMoves(grid, player, frontier)
+    if not moves:
+        if passed:
+            return 1
+        return frontierPerft(grid, -player, depth - 1, frontier, True)
+    total = 0
+    for move in moves:
+        child = [row[:] for row in grid]
+        othello_logic.applyMove(child, move, player)
+        frontier.place(*move)
+        total += frontierPerft(child, -player, depth - 1, frontier)
+        frontier.remove(*move)
+    return total
+
+
+def _checkedPerft(count, depth):
+    if count != PERFT_COUNTS[depth]:
+        raise AssertionError(f'perft({depth}) = {count}, expected {PERFT_COUNTS[depth]}: move generation is wrong')
+
+
+def benchPerft(depth=6):
+    start = time.perf_counter()
+    count = perft(othello_logic.startGrid(), 1, depth)
+    elapsed = time.perf_counter() - start
+    _checkedPerft(count, depth)
+    return count / elapsed
+
+
+def benchFrontierPerft(depth=6):
+    grid = othello_logic.startGrid()
+    start = time.perf_counter()
+    count = frontierPerft(grid, 1, depth, othello_logic.Frontier(grid))
+    elapsed = time.perf_counter() - start
+    _checkedPerft(count, depth)
+    return count / elapsed
+
+
+def benchBitboardPerft(depth=8):
+    mover, opponent = othello_logic.gridMasks(othello_logic.startGrid(), 1)
+    start = time.perf_counter()
+    count = bitboardPerft(mover, opponent, depth)
+    elapsed = time.perf_counter() - start
+    _checkedPerft(count, depth)
+    return count / elapsed
+
+
+def benchSearch(depth=5, positions=8):
+    """Nodes per second of fixed depth searches of the same sample positions, each from a clean table"""
+    engine = ComputerPlayer()
+    nodes = 0
+    elapsed = 0.0
+    for grid, player in othello_logic.randomPositions(positions, 20):
+        engine.reset()
+        engine.nodes = 0
+        start = time.perf_counter()
+        engine.computerHard(grid, depth, None, None, player)
+        elapsed += time.perf_counter() - start
+        nodes += engine.nodes
+    return nodes / elapsed
+
+
+def benchEvaluation(rounds=200):
+    evaluate = Evaluator().evaluate
+    boards = [othello_logic.gridMasks(grid, player) for grid, player in othello_logic.randomPositions(50, 24)]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for mover, opponent in boards:
+            evaluate(mover, opponent)
+    return rounds * len(boards) / (time.perf_counter() - start)
+
+
+def benchStartup():
+    """Milliseconds for a fresh interpreter to import the game and build its window (dummy video driver)"""
+    code = 'import render_bench; render_bench.loadGame()'
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(BASELINE_PATH), check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def benchFrame(frames=200):
+    """Milliseconds per full frame of a midgame position"""
+    import render_bench
+
+    results, _ = render_bench.runBenchmark(['midgame'], frames)
+    return results['midgame']['frameMs']
+
+
+# name: (function, unit, higher is better)
+BENCHMARKS = {
+    'perft': (benchPerft, 'leaves/s', True),
+    'frontierPerft': (benchFrontierPerft, 'leaves/s', True),
+    'bitboardPerft': (benchBitboardPerft, 'leaves/s', True),
+    'search': (benchSearch, 'nodes/s', True),
+    'evaluation': (benchEvaluation, 'evals/s', True),
+    'startup': (benchStartup, 'ms', False),
+    'frame': (benchFrame, 'ms', False),
+}
+
+
+def machineFingerprint():
+    """(fingerprint, description): what makes timings comparable, hashed to a short key"""
+    machine = {
+        'system': platform.system(),
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+    }
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as file:
+            for line in file:
+                if line.startswith('model name'):
+                    machine['processor'] = line.split(':', 1)[1].strip()
+                    break
+    digest = hashlib.sha1(json.dumps(machine, sort_keys=True).encode()).hexdigest()[:12]
+    return digest, machine
+
+
+def runSuite(names=None, repeats=5, progress=None):
+    """Run the benchmarks, return {name: {'unit', 'higher', 'samples'}}"""
+    results = {}
+    for name in names or BENCHMARKS:
+        function, unit, higher = BENCHMARKS[name]
+        function()
+        samples = [function() for _ in range(repeats)]
+        results[name] = {'unit': unit, 'higher': higher, 'samples': samples}
+        if progress is not None:
+            progress(name, results[name])
+    return results
+
+
+def compareResults(result, baseline, tolerance=0.05, sigmas=3.0):
+    """(change, verdict) of one benchmark against its baseline
+
+    `change` is the relative change of the mean, positive when better.
+    The verdict is 'regression' or 'improvement' only when the change is
+    larger than `tolerance` and more than `sigmas` standard errors.
+    """
+    new, old = result['samples'], baseline['samples']
+    newMean, oldMean = statistics.fmean(new), statistics.fmean(old)
+    change = (newMean - oldMean) / oldMean
+    if not result['higher']:
+        change = -change
+    error = (statistics.variance(new) / len(new) if len(new) > 1 else 0.0) + \
+            (statistics.variance(old) / len(old) if len(old) > 1 else 0.0)
+    significant = abs(newMean - oldMean) > sigmas * error ** 0.5
+    if significant and change < -tolerance:
+        return change, 'regression'
+    if significant and change > tolerance:
+        return change, 'improvement'
+    return change, 'same'
+
+
+def loadBaselines(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def saveBaseline(results, path=BASELINE_PATH):
+    """Store `results` as this machine's baseline, merged over any benchmarks not run this time"""
+    fingerprint, machine = machineFingerprint()
+    baselines = loadBaselines(path)
+    entry = baselines.setdefault(fingerprint, {'machine': machine, 'results': {}})
+    entry['machine'] = machine
+    entry['saved'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    entry['results'].update(results)
+    with open(path, 'w') as file:
+        json.dump(baselines, file, indent=1, sort_keys=True)
+
+
+def _summary(result):
+    samples = result['samples']
+    mean = statistics.fmean(samples)
+    spread = statistics.stdev(samples) / mean * 100 if len(samples) > 1 else 0.0
+    return f'{mean:14,.{1 if mean >= 100 else 3}f} {result["unit"]:9} ±{spread:4.1f}%'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Performance regression suite')
+    parser.add_argument('benchmarks', nargs='*', help=f'any of {", ".join(BENCHMARKS)} (default: all)')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.05, help='smallest change reported (0.05 = 5%%)')
+    parser.add_argument('--sigmas', type=float, default=3.0, help='standard errors a change must exceed')
+    parser.add_argument('--save', action='store_true', help="store the results as this machine's baseline")
+    parser.add_argument('--accept-regressions', action='store_true',
+                        help='with --save, store the results even when a benchmark regressed')
+    parser.add_argument('--baselines', default=BASELINE_PATH)
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmark {", ".join(unknown)}')
+    fingerprint, machine = machineFingerprint()
+    print(f'machine {fingerprint}: {machine["processor"]}, {machine["cpus"]} cpus, {machine["python"]}')
+    baseline = loadBaselines(args.baselines).get(fingerprint, {}).get('results', {})
+    regressions = []
+
+    def report(name, result):
+        line = f'{name:14} {_summary(result)}'
+        if name in baseline:
+            change, verdict = compareResults(result, baseline[name], args.tolerance, args.sigmas)
+            line += f'   baseline {_summary(baseline[name])}  {change * 100:+6.1f}% {verdict}'
+            if verdict == 'regression':
+                regressions.append(name)
+        print(line, flush=True)
+
+    results = runSuite(args.benchmarks or None, args.repeats, report)
+    if not baseline:
+        print('no baseline for this machine yet, run with --save to store one')
+    if args.save and regressions and not args.accept_regressions:
+        # saving would make the slower numbers the standard the next run is held to
+        print('baseline not saved because of the regression; add --accept-regressions to save it anyway')
+    elif args.save:
+        saveBaseline(results, args.baselines)
+        print(f'baseline saved to {args.baselines}')
+    if regressions:
+        print(f'REGRESSION: {", ".join(regressions)}')
+        sys.exit(1)
@@ -0,0 +1,91 @@
+ANIMATION_FRAMES = 30
+
+
+class PieceLayer:
+    """Draws the board and its discs from one cached surface, redrawing only the squares that changed
+
+    # WHAT IT HOLDS:
+    # images[player]: the disc image for 1 (white) and -1 (black)
+    # transitions[player]: the frames of a disc turning into `player`'s colour
+    # background: the empty board, drawn at (0, 0) of the window
+    # board: a copy of the background with every settled disc drawn on it
+    # shown: one byte per square (row * 8 + col), what `board` shows there
+    #   (0 empty, 1 white, 3 black: the cell value & 3)
+    # frames: one byte per square, 0 when the square is not animating,
+    #   otherwise the transition frame shown plus one
+    # The board itself (Grid.gridLogic) is not copied; draw reads it. An
+    # animating square still holds its old colour, so the frames to show
+    # are those of the other colour.
+    #
+    # HOW IT WORKS:
+    # Every draw compares the 64 cells with `shown` and repaints just the
+    # squares that differ on `board` (background tile, then the disc), so
+    # a move costs one small blit per disc it changed, however the board
+    # was changed: a move, takeback or new game. The frame itself is one
+    # blit of `board` plus the discs in the middle of a flip, which are
+    # left off `board` while they animate.
+    """
+
+    __slots__ = ('images', 'transitions', 'background', 'board', 'shown', 'frames', 'size', 'origin')
+
+    def __init__(self, images, transitions, size, background, origin=(80, 80)):
+        self.images = images
+        self.transitions = transitions
+        self.size = size
+        self.origin = origin
+        self.background = background
+        # converted to the display format, which makes the per-frame blit the cheapest one possible
+        self.board = background.convert()
+        self.shown = bytearray(64)
+        self.frames = bytearray(64)
+
+    def reset(self):
+        self.frames[:] = bytes(64)
+
+    def resync(self, changed):
+        """Squares in the `changed` bitboard were set without an animation, drop any frame left on them"""
+        frames = self.frames
+        while changed:
+            low = changed & -changed
+            frames[low.bit_length() - 1] = 0
+            changed ^= low
+
+    def drawSquare(self, row, col, cell):
+        width, height = self.size
+        left, top = self.origin
+        area = (left + col * width, top + row * height, width, height)
+        self.board.blit(self.background, area[:2], area)
+        if cell:
+            self.board.blit(self.images[cell], area[:2])
+
+    def draw(self, window, grid):
+        transitions = self.transitions
+        frames = self.frames
+        shown = self.shown
+        width, height = self.size
+        left, top = self.origin
+        flipping = []
+        for row, line in enumerate(grid):
+            base = row * 8
+            for col, cell in enumerate(line):
+                index = base + col
+                frame = frames[index]
+                state = 0 if frame else cell & 3
+                if shown[index] != state:
+                    self.drawSquare(row, col, cell if state else 0)
+                    shown[index] = state
+                if frame:
+                    flipping.append((transitions[-cell][frame - 1], (left + col * width, top + row * height)))
+        window.blit(self.board, (0, 0))
+        if flipping:
+            window.blits(flipping, False)
+
+    def animate(self, row, col, redraw):
+        """Play the flip animation of one square, calling `redraw()` for every frame"""
+        index = row * 8 + col
+        frames = self.frames
+        count = len(self.transitions[1])
+        for step in range(ANIMATION_FRAMES):
+            frames[index] = step * count // ANIMATION_FRAMES + 1
+            redraw()
+        frames[index] = 0
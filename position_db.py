@@ -0,0 +1,295 @@
+import mmap
+import struct
+import tempfile
+
+from game_record import readRecords
+from othello_logic import canonicalKey, replay, KEY
+from symmetry import TRANSFORMS, INVERSE
+
+# ===== DATABASE FORMAT =====
+#
+# header : magic 'OPDB', version, number of slots (a power of two), entries
+# slots  : open addressing hash table, linear probing, fixed width slots:
+#          mover mask, opponent mask, count, sum of results, sum of engine
+#          scores (both 64 bit), number of scored visits, best move (255 = none)
+#
+# Results and scores are stored from the point of view of the side to move,
+# and positions are stored under their canonical key (see canonicalKey), so
+# every reflection/rotation of a position shares one slot.
+
+MAGIC = b'OPDB'
+VERSION = 2
+HEADER = struct.Struct('<4sIQQ')
+# the sums are 64 bit: the opening positions of a large campaign pass 2**31 in disc difference
+SLOT = struct.Struct('<QQIqqIB3x')
+NO_MOVE = 255
+MASK64 = (1 << 64) - 1
+# builder only: per position and move, mover mask, opponent mask, square, games, sum of results
+MOVE_SLOT = struct.Struct('<QQB3xIq')
+# positions (and moves) aggregated in memory before they are added to the tables on disk
+BATCH_SIZE = 50000
+
+
+def _slotIndex(mover, opponent, bits):
+    h = ((mover * 0x9E3779B97F4A7C15) ^ (opponent * 0xC2B2AE3D27D4EB4F)) & MASK64
+    return h >> (64 - bits)
+
+
+def _moveIndex(mover, opponent, square, bits):
+    return _slotIndex(mover, opponent ^ ((square + 1) * 0xD6E8FEB86659FD93 & MASK64), bits)
+
+
+class PositionStats:
+    """What the database knows about one position
+
+    # WHAT IT HOLDS:
+    # - count: how many times the position was reached
+    # - meanResult: average final disc difference for the side to move
+    # - meanScore: average engine score for the side to move (None if never scored)
+    # - bestMove: the (row, col) next move with the best average result (None if unknown)
+    """
+
+    __slots__ = ('count', 'meanResult', 'meanScore', 'bestMove')
+
+    def __init__(self, count, meanResult, meanScore, bestMove):
+        self.count = count
+        self.meanResult = meanResult
+        self.meanScore = meanScore
+        self.bestMove = bestMove
+
+    def __repr__(self):
+        return (f'PositionStats(count={self.count}, meanResult={self.meanResult:.2f}, '
+                f'meanScore={self.meanScore}, bestMove={self.bestMove})')
+
+
+class _SlotTable:
+    """Open addressing table of fixed width slots in a memory mapped temporary file, what the builder adds batches to
+
+    # HOW IT WORKS:
+    # A slot holds `keyFields` key fields, then counters that `add` sums
+    # into, then fields `add` leaves alone (`tail` in a new slot). A first
+    # counter of 0 marks a free slot; probing is linear from `index(*key,
+    # bits)`, as PositionDB.lookupKey expects. Once more than half the slots
+    # are in use every entry is moved into a new file twice the size, so
+    # however many positions there are only the pages being touched need
+    # to be in memory.
+    """
+
+    def __init__(self, slot, index, keyFields, tail=(), header=0, bits=10):
+        self.slot = slot
+        self.index = index
+        self.keyFields = keyFields
+        self.tail = tail
+        self.header = header
+        self.entries = 0
+        self.bits = bits
+        self.file, self.map = self._create(bits)
+
+    def _create(self, bits):
+        file = tempfile.TemporaryFile()
+        file.truncate(self.header + (self.slot.size << bits))
+        return file, mmap.mmap(file.fileno(), 0)
+
+    def find(self, key):
+        """Offset of the slot holding `key`, or of the free slot where it belongs"""
+        mask = (1 << self.bits) - 1
+        index = self.index(*key, self.bits)
+        keyFields = self.keyFields
+        while True:
+            offset = self.header + index * self.slot.size
+            fields = self.slot.unpack_from(self.map, offset)
+            if not fields[keyFields] or fields[:keyFields] == key:
+                return offset
+            index = (index + 1) & mask
+
+    def get(self, key):
+        """The fields after the key, or None"""
+        fields = self.slot.unpack_from(self.map, self.find(key))
+        return fields[self.keyFields:] if fields[self.keyFields] else None
+
+    def add(self, key, counters):
+        offset = self.find(key)
+        fields = self.slot.unpack_from(self.map, offset)
+        keyFields = self.keyFields
+        end = keyFields + len(counters)
+        if fields[keyFields]:
+            counters = [old + new for old, new in zip(fields[keyFields:end], counters)]
+            tail = fields[end:]
+        else:
+            self.entries += 1
+            tail = self.tail
+        self.slot.pack_into(self.map, offset, *key, *counters, *tail)
+        if self.entries * 2 > 1 << self.bits:
+            self._grow()
+
+    def slots(self):
+        """(offset, fields) of every used slot, in table order"""
+        size = self.slot.size
+        for offset in range(self.header, self.header + (size << self.bits), size):
+            fields = self.slot.unpack_from(self.map, offset)
+            if fields[self.keyFields]:
+                yield offset, fields
+
+    def _grow(self):
+        oldFile, oldMap, oldBits = self.file, self.map, self.bits
+        self.bits += 1
+        self.file, self.map = self._create(self.bits)
+        size = self.slot.size
+        for offset in range(self.header, self.header + (size << oldBits), size):
+            fields = self.slot.unpack_from(oldMap, offset)
+            if fields[self.keyFields]:
+                self.slot.pack_into(self.map, self.find(fields[:self.keyFields]), *fields)
+        oldMap.close()
+        oldFile.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def buildPositionDB(recordPaths, dbPath, maxPly=None, batchSize=BATCH_SIZE):
+    """Replay every game in `recordPaths` and write the position database to `dbPath`
+
+    # HOW IT WORKS:
+    # Positions are counted in a dict until `batchSize` different ones have
+    # been seen, then added to a table of slots in a memory mapped
+    # temporary file, and the dict starts again; a second table does the
+    # same per position and move. So memory holds one batch whatever the
+    # size of the campaign. Once every game is in, each position's best
+    # move is picked from the move table and the position table is written
+    # out as the database. `maxPly` indexes only the first plies of each
+    # game. Returns the number of positions written.
+    """
+    if isinstance(recordPaths, str):
+        recordPaths = [recordPaths]
+    table = _SlotTable(SLOT, _slotIndex, 2, (NO_MOVE,), HEADER.size)
+    moveTable = _SlotTable(MOVE_SLOT, _moveIndex, 3)
+    try:
+        positions = {}
+        moves = {}
+        for path in recordPaths:
+            for record in readRecords(path):
+                if record.result is None:
+                    continue
+                for ply, (grid, player, move) in enumerate(replay(record)):
+                    if maxPly is not None and ply >= maxPly:
+                        break
+                    key, t = canonicalKey(grid, player)
+                    entry = positions.get(key)
+                    if entry is None:
+                        entry = positions[key] = [0, 0, 0, 0]
+                    result = record.result * player
+                    entry[0] += 1
+                    entry[1] += result
+                    if record.scores is not None:
+                        entry[2] += record.scores[ply]
+                        entry[3] += 1
+                    if move is not None:
+                        moveKey = (key, TRANSFORMS[t][move[0] * 8 + move[1]])
+                        moveStats = moves.get(moveKey)
+                        if moveStats is None:
+                            moveStats = moves[moveKey] = [0, 0]
+                        moveStats[0] += 1
+                        moveStats[1] += result
+                if len(positions) >= batchSize or len(moves) >= batchSize:
+                    _addBatch(table, moveTable, positions, moves)
+        _addBatch(table, moveTable, positions, moves)
+        _pickBestMoves(table, moveTable)
+        HEADER.pack_into(table.map, 0, MAGIC, VERSION, 1 << table.bits, table.entries)
+        with open(dbPath, 'wb') as file:
+            chunk = 1 << 20
+            for start in range(0, len(table.map), chunk):
+                file.write(table.map[start:start + chunk])
+        return table.entries
+    finally:
+        table.close()
+        moveTable.close()
+
+
+def _addBatch(table, moveTable, positions, moves):
+    for key, counters in positions.items():
+        table.add(KEY.unpack(key), counters)
+    for (key, square), counters in moves.items():
+        moveTable.add((*KEY.unpack(key), square), counters)
+    positions.clear()
+    moves.clear()
+
+
+def _pickBestMoves(table, moveTable):
+    """Give each position the move with the best average result, then the most played, then the lowest square"""
+    bestOffset = SLOT.size - 4
+    for _, (mover, opponent, square, count, sumResult) in moveTable.slots():
+        offset = table.find((mover, opponent))
+        best = table.map[offset + bestOffset]
+        if best != NO_MOVE:
+            bestCount, bestSum = moveTable.get((mover, opponent, best))
+            if (sumResult / count, count, -square) <= (bestSum / bestCount, bestCount, -best):
+                continue
+        table.map[offset + bestOffset] = square
+
+
+class PositionDB:
+    """Read only view of a position database, memory mapped so opening it costs nothing
+
+    A lookup hashes the canonical key and probes a few slots straight in the
+    mapped file, so only the pages that are touched are ever read from disk.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slotCount, self.entries = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a position database')
+        if version != VERSION:
+            self.close()
+            raise ValueError(f'{path} is a version {version} position database, rebuild it for version {VERSION}')
+        self.bits = self.slotCount.bit_length() - 1
+
+    def __len__(self):
+        return self.entries
+
+    def lookupKey(self, key):
+        """Return the raw slot (count, sumResult, sumScore, scored, bestSquare) for a canonical key, or None"""
+        mover, opponent = KEY.unpack(key)
+        index = _slotIndex(mover, opponent, self.bits)
+        while True:
+            slot = SLOT.unpack_from(self.map, HEADER.size + index * SLOT.size)
+            if slot[2] == 0:
+                return None
+            if slot[0] == mover and slot[1] == opponent:
+                return slot[2:]
+            index = (index + 1) & (self.slotCount - 1)
+
+    def lookup(self, grid, player):
+        """Return PositionStats for `player` to move on `grid`, or None if the position was never seen"""
+        key, t = canonicalKey(grid, player)
+        slot = self.lookupKey(key)
+        if slot is None:
+            return None
+        count, sumResult, sumScore, scored, bestSquare = slot
+        bestMove = None
+        if bestSquare != NO_MOVE:
+            bestMove = divmod(INVERSE[t][bestSquare], 8)
+        return PositionStats(count, sumResult / count, sumScore / scored if scored else None, bestMove)
+
+    def close(self):
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 3:
+        print('usage: python position_db.py <output.db> <games.rec> [more.rec ...]')
+        sys.exit(1)
+    print(f'{buildPositionDB(sys.argv[2:], sys.argv[1])} positions written to {sys.argv[1]}')
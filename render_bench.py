@@ -0,0 +1,215 @@
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# the benchmark never opens a window, so it also runs on machines without a display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+import othello_logic
+
+# ===== RENDER BENCHMARK =====
+#
+# Draws scripted board states through the real game code (Othello.draw and
+# Grid.drawGrid from 'final version AI.py') under SDL's dummy video driver
+# and reports, per scenario:
+#   fps        : full frames (Othello.draw) per second
+#   stages     : mean ms of each part of a frame, each timed on its own
+#   allocBytes : Python memory allocated during one frame and released again
+#                (tracemalloc peak above the starting level; SDL's own
+#                surface memory is not seen by tracemalloc)
+#   allocBlocks: Python memory blocks still held after one frame
+# Results can be saved as a JSON baseline and later runs compared with it;
+# a scenario whose frame time grew by more than the tolerance is reported
+# as slower and makes the run exit with status 1.
+#
+# The game loads its images from the working directory. When they are not
+# there, plain placeholder images of the same layout are generated once
+# into PLACEHOLDER_DIR in the temporary directory and reused by every later
+# run, so timings are comparable between runs but not with the real artwork.
+
+GAME_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'final version AI.py')
+ASSETS = ['wood.png', 'WhiteToken.png', 'BlackToken.png'] + \
+         [f'{name}{i}.png' for name in ('BlackToWhite', 'WhiteToBlack') for i in range(1, 4)]
+STAGES = ('fill', 'drawGrid', 'pieces', 'moves', 'scores', 'endScreen', 'update')
+SCENARIOS = ('empty', 'opening', 'midgame', 'full', 'endScreen', 'animating')
+PLACEHOLDER_DIR = os.path.join(tempfile.gettempdir(), 'othello-placeholder-assets')
+
+
+def writePlaceholderAssets(directory):
+    """Write stand-ins for the game's images: a 7x3 tile wood sheet and flat disc images"""
+    pygame.init()
+    sheet = pygame.Surface((7 * 32, 3 * 32))
+    for tile in range(21):
+        shade = 90 + tile * 5
+        sheet.fill((shade, shade * 2 // 3, 40), ((tile % 7) * 32, (tile // 7) * 32, 32, 32))
+    pygame.image.save(sheet, os.path.join(directory, 'wood.png'))
+    colours = {'WhiteToken.png': (240, 240, 240), 'BlackToken.png': (20, 20, 20)}
+    for i in range(1, 4):
+        colours[f'BlackToWhite{i}.png'] = (20 + i * 55,) * 3
+        colours[f'WhiteToBlack{i}.png'] = (240 - i * 55,) * 3
+    for name, colour in colours.items():
+        disc = pygame.Surface((80, 80), pygame.SRCALPHA)
+        pygame.draw.circle(disc, colour, (40, 40), 34)
+        pygame.image.save(disc, os.path.join(directory, name))
+
+
+def loadGame(assets=None):
+    """Import the game module and build an Othello in a directory holding its images
+
+    Returns (game, placeholders), `placeholders` True when generated images were used.
+    """
+    assets = assets or os.path.dirname(GAME_PATH)
+    placeholders = not all(os.path.exists(os.path.join(assets, name)) for name in ASSETS)
+    if placeholders:
+        assets = PLACEHOLDER_DIR
+        if not all(os.path.exists(os.path.join(assets, name)) for name in ASSETS):
+            os.makedirs(assets, exist_ok=True)
+            writePlaceholderAssets(assets)
+    spec = importlib.util.spec_from_file_location('othello_game', GAME_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    previous = os.getcwd()
+    os.chdir(assets)
+    try:
+        game = module.Othello()
+    finally:
+        os.chdir(previous)
+    return game, placeholders
+
+
+def setScenario(game, name):
+    """Put the game into one of SCENARIOS"""
+    grid = game.grid
+    grid.pieces.reset()
+    game.gameOver = False
+    game.currentPlayer = 1
+    if name == 'empty':
+        board = [[0] * 8 for _ in range(8)]
+    elif name == 'opening':
+        board = othello_logic.startGrid()
+    elif name in ('full', 'endScreen'):
+        rng = random.Random(0)
+        board = [[rng.choice((1, -1)) for _ in range(8)] for _ in range(8)]
+    else:
+        board, game.currentPlayer = othello_logic.randomPositions(1, 30)[0]
+    for line, values in zip(grid.gridLogic, board):
+        line[:] = values
+    # written behind insertToken's back, so the move frontier has to be rebuilt
+    grid.frontier.reset(grid.gridLogic)
+    grid.player1Score = grid.calculatePlayerScore(game.player1)
+    grid.player2Score = grid.calculatePlayerScore(game.player2)
+    if name == 'endScreen':
+        game.gameOver = True
+    elif name == 'animating':
+        # a large capture half way through its flips
+        discs = [row * 8 + col for row in range(8) for col in range(8) if board[row][col]]
+        for square in discs[:8]:
+            grid.pieces.frames[square] = 2
+
+
+def timeCall(call, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        call()
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def measure(game, name, frames=200):
+    """Benchmark one scenario, return a dict of results"""
+    setScenario(game, name)
+    grid = game.grid
+    screen = game.screen
+    game.draw()
+    frameMs = timeCall(game.draw, frames)
+    stages = {
+        # Othello.draw only clears the strip right of the board
+        'fill': timeCall(lambda: screen.fill((0, 0, 0), (960, 0, 1100 - 960, 800)), frames),
+        'drawGrid': timeCall(lambda: grid.drawGrid(screen), frames),
+        'pieces': timeCall(lambda: grid.pieces.draw(screen, grid.gridLogic), frames),
+        'moves': timeCall(lambda: grid.findAvailMoves(grid.gridLogic, game.currentPlayer), frames),
+        'scores': timeCall(lambda: (grid.drawScore('White', grid.player1Score),
+                                    grid.drawScore('Black', grid.player2Score)), frames),
+        'endScreen': timeCall(grid.endScreen, frames) if game.gameOver else 0.0,
+        'update': timeCall(pygame.display.update, frames),
+    }
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    game.draw()
+    current, peak = tracemalloc.get_traced_memory()
+    held = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    return {
+        'fps': round(1000 / frameMs, 1),
+        'frameMs': round(frameMs, 4),
+        'stages': {stage: round(stages[stage], 4) for stage in STAGES},
+        'allocBytes': peak - before,
+        'allocBlocks': held,
+    }
+
+
+def runBenchmark(scenarios=SCENARIOS, frames=200, assets=None):
+    """Return ({scenario: results}, placeholders) for every scenario"""
+    game, placeholders = loadGame(assets)
+    try:
+        return {name: measure(game, name, frames) for name in scenarios}, placeholders
+    finally:
+        if game.positionDB is not None:
+            game.positionDB.close()
+        pygame.quit()
+
+
+def compare(results, baseline, tolerance=0.15):
+    """Lines describing each scenario against the baseline and the names of those slower than `tolerance`"""
+    lines = []
+    slower = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['frameMs'] / baseline[name]['frameMs']
+        verdict = 'ok'
+        if ratio > 1 + tolerance:
+            verdict = 'SLOWER'
+            slower.append(name)
+        elif ratio < 1 - tolerance:
+            verdict = 'faster'
+        lines.append(f'{name:10} {baseline[name]["frameMs"]:8.3f} -> {result["frameMs"]:8.3f} ms/frame '
+                     f'({ratio:5.2f}x) {verdict}')
+    return lines, slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless rendering benchmark of the game screen')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='run only these scenarios')
+    parser.add_argument('--assets', help='directory holding the game images')
+    parser.add_argument('--save', metavar='JSON', help='write the results as a baseline')
+    parser.add_argument('--baseline', metavar='JSON', help='compare with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed frame time growth (0.15 = 15%%)')
+    args = parser.parse_args()
+    results, placeholders = runBenchmark(args.scenario or SCENARIOS, args.frames, args.assets)
+    if placeholders:
+        print('(game images not found, using generated placeholders)')
+    print(f'{"scenario":10} {"fps":>8} ' + ' '.join(f'{stage:>9}' for stage in STAGES) + '   bytes blocks')
+    for name, result in results.items():
+        stages = ' '.join(f'{result["stages"][stage]:9.3f}' for stage in STAGES)
+        print(f'{name:10} {result["fps"]:8.1f} {stages} {result["allocBytes"]:7d} {result["allocBlocks"]:6d}')
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            lines, slower = compare(results, json.load(file), args.tolerance)
+        print('\n'.join(lines))
+        if slower:
+            sys.exit(1)
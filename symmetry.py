@@ -0,0 +1,87 @@
+from bitboard import FULL
+
+# ===== BOARD SYMMETRIES =====
+#
+# The board has 8 symmetries (4 rotations, each with or without a mirror).
+# Symmetry t is made of up to three steps done in this order:
+#   t & 4: transpose (swap rows and columns)
+#   t & 2: flip rows (row -> 7 - row)
+#   t & 1: flip columns (col -> 7 - col)
+# Each step is a handful of shifts and masks on the whole bitboard, so
+# finding the canonical form of a position costs a few microseconds.
+
+
+def _transformSquare(t, row, col):
+    if t & 4:
+        row, col = col, row
+    if t & 2:
+        row = 7 - row
+    if t & 1:
+        col = 7 - col
+    return row * 8 + col
+
+
+# TRANSFORMS[t][square] is where `square` lands under symmetry t (0 = identity),
+# INVERSE[t] maps it back
+TRANSFORMS = [[_transformSquare(t, square // 8, square % 8) for square in range(64)] for t in range(8)]
+INVERSE = [[0] * 64 for _ in range(8)]
+for _t in range(8):
+    for _square in range(64):
+        INVERSE[_t][TRANSFORMS[_t][_square]] = _square
+
+
+def flipRows(mask):
+    """Mirror top to bottom: row r becomes row 7 - r (a byte swap)"""
+    return int.from_bytes(mask.to_bytes(8, 'little'), 'big')
+
+
+def flipColumns(mask):
+    """Mirror left to right: column c becomes column 7 - c"""
+    mask = ((mask >> 1) & 0x5555555555555555) | ((mask & 0x5555555555555555) << 1)
+    mask = ((mask >> 2) & 0x3333333333333333) | ((mask & 0x3333333333333333) << 2)
+    return ((mask >> 4) & 0x0F0F0F0F0F0F0F0F) | ((mask & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def transpose(mask):
+    """Mirror in the a1-h8 diagonal: (row, col) becomes (col, row)"""
+    t = 0x0F0F0F0F00000000 & (mask ^ (mask << 28))
+    mask ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (mask ^ (mask << 14))
+    mask ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (mask ^ (mask << 7))
+    mask ^= t ^ (t >> 7)
+    return mask & FULL
+
+
+def transformMask(mask, t):
+    if t & 4:
+        mask = transpose(mask)
+    if t & 2:
+        mask = flipRows(mask)
+    if t & 1:
+        mask = flipColumns(mask)
+    return mask
+
+
+def allTransforms(mask):
+    """The 8 images of `mask`, indexed by symmetry number"""
+    rows = flipRows(mask)
+    plain = (mask, flipColumns(mask), rows, flipColumns(rows))
+    mask = transpose(mask)
+    rows = flipRows(mask)
+    return plain + (mask, flipColumns(mask), rows, flipColumns(rows))
+
+
+def canonical(mover, opponent):
+    """Return (mover, opponent, t): the smallest of the 8 images of the position and the symmetry giving it
+
+    Every position that is a rotation or reflection of another gets the same
+    canonical (mover, opponent), so caches keyed on it store each shape once.
+    """
+    movers = allTransforms(mover)
+    opponents = allTransforms(opponent)
+    best = 0
+    for t in range(1, 8):
+        if movers[t] < movers[best] or (movers[t] == movers[best] and opponents[t] < opponents[best]):
+            best = t
+    return movers[best], opponents[best], best
@@ -0,0 +1,230 @@
+import random
+import struct
+import tracemalloc
+from multiprocessing import shared_memory
+
+import othello_logic
+import symmetry
+from symmetry import TRANSFORMS, INVERSE
+
+# Bound types of a stored score
+EXACT, LOWER, UPPER = 0, 1, 2
+NO_MOVE = 64
+
+
+class TranspositionTable:
+    """Search results keyed by position, shared by every search of one engine
+
+    # WHAT IT HOLDS:
+    # key -> (depth, flag, score, square, generation)
+    # With `canonical` the key is the canonical form of the position (see
+    # symmetry.py), so one entry answers for all 8 rotations and
+    # reflections of it. The stored best square is in the canonical frame
+    # and is mapped back to the real board with the symmetry returned by
+    # `key`. Without `canonical` the raw (mover, opponent) pair is the key.
+    # The table lives as long as its engine, across moves and games.
+    # `newGeneration` is called at the start of every search; entries are
+    # stamped with the generation that stored them. When the table reaches
+    # `maxEntries`, entries older than `keepGenerations` searches are
+    # dropped first, and only if that frees too little is it emptied.
+    """
+
+    def __init__(self, maxEntries=1 << 20, canonical=True, keepGenerations=2):
+        self.maxEntries = maxEntries
+        self.canonical = canonical
+        self.keepGenerations = keepGenerations
+        self.entries = {}
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def key(self, mover, opponent):
+        """Return (key, t): the table key of a position and the symmetry mapping it to the stored frame"""
+        if self.canonical:
+            mover, opponent, t = symmetry.canonical(mover, opponent)
+            return (mover, opponent), t
+        return (mover, opponent), 0
+
+    def probe(self, key, t):
+        """Return (depth, flag, score, square) with the square on the real board, or None"""
+        self.probes += 1
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.hits += 1
+        depth, flag, score, square, _ = entry
+        if square != NO_MOVE and t:
+            square = INVERSE[t][square]
+        return depth, flag, score, square
+
+    def store(self, key, t, depth, flag, score, square):
+        if square is None:
+            square = NO_MOVE
+        elif t:
+            square = TRANSFORMS[t][square]
+        entries = self.entries
+        if len(entries) >= self.maxEntries and key not in entries:
+            entries = self.age()
+        entries[key] = (depth, flag, score, square, self.generation)
+        self.stores += 1
+
+    def newGeneration(self):
+        self.generation += 1
+
+    def age(self):
+        """Drop the entries of old searches to make room, or everything if that frees less than a quarter"""
+        oldest = self.generation - self.keepGenerations + 1
+        kept = {key: entry for key, entry in self.entries.items() if entry[4] >= oldest}
+        if len(kept) > self.maxEntries * 3 // 4:
+            kept = {}
+        self.entries = kept
+        return kept
+
+    def clear(self):
+        self.entries.clear()
+        self.generation = 0
+        self.probes = self.hits = self.stores = 0
+
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """A TranspositionTable in shared memory that several processes read and write without locks
+
+    # WHAT IT HOLDS:
+    # A fixed array of SLOT entries after a small HEADER, sized once from
+    # `maxBytes` (rounded down to a power of two slots), so memory never
+    # grows whatever the number of workers. Each slot is three 64 bit words:
+    #   mover ^ data, opponent ^ data, data
+    # where data packs score, depth, flag, square and generation. Two
+    # processes writing the same slot at once can leave words from both;
+    # the XOR check then fails on probe and the entry is simply treated as
+    # missing, so no lock is needed.
+    # The process that creates the table owns it: its newGeneration moves
+    # the shared generation on, the others only follow it, and only it
+    # unlinks the memory on close. Others join with attach(name).
+    """
+
+    HEADER = struct.Struct('<4sII')
+    SLOT = struct.Struct('<QQQ')
+    MAGIC = b'OTTS'
+
+    def __init__(self, maxBytes=64 << 20, canonical=True, name=None):
+        super().__init__(0, canonical)
+        self.owner = name is None
+        if self.owner:
+            slots = 1 << ((maxBytes - self.HEADER.size) // self.SLOT.size).bit_length() - 1
+            self.memory = shared_memory.SharedMemory(create=True, size=self.HEADER.size + slots * self.SLOT.size)
+            self.HEADER.pack_into(self.memory.buf, 0, self.MAGIC, slots, 0)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        magic, slots, self.generation = self.HEADER.unpack_from(self.memory.buf, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f'{self.memory.name} is not a shared transposition table')
+        self.slotCount = slots
+        self.maxEntries = slots
+        self.buffer = self.memory.buf
+
+    @classmethod
+    def attach(cls, name, canonical=True):
+        return cls(canonical=canonical, name=name)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def _offset(self, mover, opponent):
+        index = ((mover * 0x9E3779B97F4A7C15) ^ (opponent * 0xC2B2AE3D27D4EB4F)) >> 32
+        return self.HEADER.size + (index & (self.slotCount - 1)) * self.SLOT.size
+
+    def probe(self, key, t):
+        self.probes += 1
+        mover, opponent = key
+        first, second, data = self.SLOT.unpack_from(self.buffer, self._offset(mover, opponent))
+        if not data or first ^ data != mover or second ^ data != opponent:
+            return None
+        self.hits += 1
+        square = (data >> 42) & 127
+        if square != NO_MOVE and t:
+            square = INVERSE[t][square]
+        return (data >> 32) & 255, (data >> 40) & 3, (data & 0xFFFFFFFF) - (1 << 31), square
+
+    def store(self, key, t, depth, flag, score, square):
+        if square is None:
+            square = NO_MOVE
+        elif t:
+            square = TRANSFORMS[t][square]
+        mover, opponent = key
+        offset = self._offset(mover, opponent)
+        # keep a deeper entry of the current search for another position, replace anything else
+        first, _, old = self.SLOT.unpack_from(self.buffer, offset)
+        if old and old >> 49 == self.generation & 255 and (old >> 32) & 255 > depth and first ^ old != mover:
+            return
+        data = (score + (1 << 31)) | (depth << 32) | (flag << 40) | (square << 42) | ((self.generation & 255) << 49)
+        self.SLOT.pack_into(self.buffer, offset, mover ^ data, opponent ^ data, data)
+        self.stores += 1
+
+    def newGeneration(self):
+        if self.owner:
+            self.generation += 1
+            self.HEADER.pack_into(self.buffer, 0, self.MAGIC, self.slotCount, self.generation)
+        else:
+            self.generation = self.HEADER.unpack_from(self.buffer, 0)[2]
+
+    def clear(self):
+        if self.owner:
+            self.buffer[self.HEADER.size:] = bytes(len(self.buffer) - self.HEADER.size)
+            self.generation = 0
+            self.HEADER.pack_into(self.buffer, 0, self.MAGIC, self.slotCount, 0)
+        self.probes = self.hits = self.stores = 0
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def compareKeys(count=40, depth=5, plies=20):
+    """Search the same positions with canonical and raw keys, return {name: (hit rate, entries, bytes, nodes)}
+
+    Each position and then one random reflection of it are searched with
+    the same table, the way a game or a batch of analysis meets mirrored
+    positions. Memory is what tracemalloc sees allocated while the table
+    fills up.
+    """
+    from computer_player import ComputerPlayer
+
+    rng = random.Random(1)
+    positions = []
+    for grid, player in othello_logic.randomPositions(count, plies):
+        mover, opponent = othello_logic.gridMasks(grid, player)
+        t = rng.randrange(1, 8)
+        positions.append((mover, opponent))
+        positions.append((symmetry.transformMask(mover, t), symmetry.transformMask(opponent, t)))
+    results = {}
+    for name, canonical in (('canonical', True), ('raw', False)):
+        engine = ComputerPlayer(table=TranspositionTable(canonical=canonical))
+        tracemalloc.start()
+        for mover, opponent in positions:
+            engine.searchRoot(mover, opponent, depth, -engine.maxScore, engine.maxScore)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        table = engine.table
+        results[name] = (table.hitRate(), len(table.entries), memory, engine.nodes)
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare canonical and raw transposition table keys')
+    parser.add_argument('--positions', type=int, default=40)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--plies', type=int, default=20)
+    args = parser.parse_args()
+    results = compareKeys(args.positions, args.depth, args.plies)
+    for name, (rate, entries, memory, nodes) in results.items():
+        print(f'{name:9}  hit rate {rate:.1%}  entries {entries}  memory {memory / 1024:.0f} KiB  nodes {nodes}')
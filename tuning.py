@@ -0,0 +1,211 @@
+import argparse
+import glob
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import othello_logic
+from difficulty import LevelPlayer
+from evaluation import FEATURES, WEIGHTS_PATH, features, saveWeights
+from game_record import GameRecord, GameRecordWriter, readRecords
+
+# ===== SHARD FORMAT =====
+#
+# Training positions are stored as fixed width records in shard files
+# (shard-00000.bin, shard-00001.bin, ...) with no header, so a shard is
+# read with np.memmap and only the pages being used are in memory:
+#   mover, opponent : bitboards of the side to move and the other side
+#   features        : the evaluation FEATURES for the side to move (int8)
+#   result          : final disc difference for the side to move
+#   empties         : empty squares, for filtering by game stage
+
+RECORD = np.dtype([
+    ('mover', '<u8'),
+    ('opponent', '<u8'),
+    ('features', 'i1', (len(FEATURES),)),
+    ('result', 'i1'),
+    ('empties', 'u1'),
+])
+SHARD_SIZE = 1 << 20
+CHUNK_SIZE = 1 << 16
+
+
+def selfPlayGame(seed, level='casual', randomPlies=8):
+    """Play one engine game, the first `randomPlies` moves random for variety, return its GameRecord"""
+    rng = random.Random(seed)
+    players = {1: LevelPlayer(level, seed=seed * 2), -1: LevelPlayer(level, seed=seed * 2 + 1)}
+    grid = othello_logic.startGrid()
+    player = 1
+    moves = []
+    passes = 0
+    while passes < 2:
+        available = othello_logic.findAvailMoves(grid, player)
+        if not available:
+            passes += 1
+            player *= -1
+            continue
+        passes = 0
+        if len(moves) < randomPlies:
+            move = rng.choice(available)
+        else:
+            move = players[player].computerHard(grid, 0, None, None, player)[0]
+        othello_logic.applyMove(grid, move, player)
+        moves.append(move)
+        player *= -1
+    return GameRecord(moves, 1, othello_logic.discDifference(grid))
+
+
+def selfPlay(path, games, level='casual', randomPlies=8, seed=0, workers=None):
+    """Append `games` self-play games to the record file at `path`, played on a process pool"""
+    with ProcessPoolExecutor(workers) as pool, GameRecordWriter(path) as writer:
+        seeds = range(seed, seed + games)
+        for record in pool.map(selfPlayGame, seeds, [level] * games, [randomPlies] * games, chunksize=4):
+            writer.write(record)
+
+
+def writeShards(recordPaths, directory, shardSize=SHARD_SIZE):
+    """Turn every position of finished games in `recordPaths` into shard files, return the number of positions"""
+    if isinstance(recordPaths, str):
+        recordPaths = [recordPaths]
+    os.makedirs(directory, exist_ok=True)
+    buffer = np.zeros(shardSize, RECORD)
+    filled = shard = total = 0
+    for path in recordPaths:
+        for record in readRecords(path):
+            if record.result is None:
+                continue
+            for grid, player, move in othello_logic.replay(record):
+                if move is None:
+                    continue
+                mover, opponent = othello_logic.gridMasks(grid, player)
+                values = features(mover, opponent)
+                row = buffer[filled]
+                row['mover'] = mover
+                row['opponent'] = opponent
+                row['features'] = [values[name] for name in FEATURES]
+                row['result'] = record.result * player
+                row['empties'] = 64 - (mover | opponent).bit_count()
+                filled += 1
+                if filled == shardSize:
+                    buffer.tofile(os.path.join(directory, f'shard-{shard:05d}.bin'))
+                    total += filled
+                    filled = 0
+                    shard += 1
+    if filled:
+        buffer[:filled].tofile(os.path.join(directory, f'shard-{shard:05d}.bin'))
+        total += filled
+    return total
+
+
+def readChunks(directory, minEmpties=0, maxEmpties=64, chunkSize=CHUNK_SIZE):
+    """Yield (features as float64, result) arrays from every shard, `chunkSize` records at a time
+
+    Shards are opened with np.memmap, so however large the data set only
+    one chunk at a time is copied into memory.
+    """
+    for path in sorted(glob.glob(os.path.join(directory, 'shard-*.bin'))):
+        shard = np.memmap(path, RECORD, mode='r')
+        for start in range(0, len(shard), chunkSize):
+            chunk = shard[start:start + chunkSize]
+            keep = (chunk['empties'] >= minEmpties) & (chunk['empties'] <= maxEmpties)
+            yield chunk['features'][keep].astype(np.float64), chunk['result'][keep].astype(np.float64)
+        del shard
+
+
+def fitLeastSquares(directory, minEmpties=0, maxEmpties=64):
+    """Weights predicting the final disc difference, by least squares over every shard
+
+    # HOW IT WORKS:
+    # The normal equations only need X'X (features x features) and X'y, and
+    # both are sums over positions, so each chunk adds its share and is
+    # dropped. Memory does not grow with the data set.
+    """
+    count = len(FEATURES)
+    xtx = np.zeros((count, count))
+    xty = np.zeros(count)
+    rows = 0
+    for x, y in readChunks(directory, minEmpties, maxEmpties):
+        xtx += x.T @ x
+        xty += x.T @ y
+        rows += len(y)
+    weights = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+    return dict(zip(FEATURES, weights)), rows
+
+
+def fitLogistic(directory, minEmpties=0, maxEmpties=64, iterations=8, ridge=1e-3):
+    """Weights predicting the chance of winning (draws count half), by logistic regression
+
+    # HOW IT WORKS:
+    # Newton's method: each iteration is one pass over the shards that sums
+    # the gradient and the Hessian chunk by chunk, then takes one step.
+    # A small ridge term keeps the step defined when a feature is rare.
+    """
+    count = len(FEATURES)
+    weights = np.zeros(count)
+    rows = 0
+    for _ in range(iterations):
+        gradient = np.zeros(count)
+        hessian = np.eye(count) * ridge
+        rows = 0
+        for x, y in readChunks(directory, minEmpties, maxEmpties):
+            target = (np.sign(y) + 1) / 2
+            predicted = 1 / (1 + np.exp(-(x @ weights)))
+            gradient += x.T @ (target - predicted)
+            hessian += (x * (predicted * (1 - predicted))[:, None]).T @ x
+            rows += len(y)
+        gradient -= ridge * weights
+        weights += np.linalg.solve(hessian, gradient)
+    return dict(zip(FEATURES, weights)), rows
+
+
+def engineWeights(weights, largest=100):
+    """Scale fitted weights to the integers Evaluator uses, the largest in size becoming `largest`"""
+    size = max((abs(value) for value in weights.values()), default=0)
+    if not size or not all(np.isfinite(value) for value in weights.values()):
+        raise ValueError(f'fitted weights {weights} cannot be scaled: the fit is empty, all zero or diverged')
+    scale = largest / size
+    return {name: int(round(value * scale)) for name, value in weights.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Self-play data and evaluation weight fitting')
+    commands = parser.add_subparsers(dest='command', required=True)
+    play = commands.add_parser('selfplay', help='append engine games to a record file')
+    play.add_argument('records')
+    play.add_argument('--games', type=int, default=100)
+    play.add_argument('--level', default='casual')
+    play.add_argument('--random-plies', type=int, default=8)
+    play.add_argument('--seed', type=int, default=0)
+    play.add_argument('--workers', type=int, default=None)
+    shards = commands.add_parser('shards', help='write training shards from record files')
+    shards.add_argument('directory')
+    shards.add_argument('records', nargs='+')
+    fit = commands.add_parser('fit', help='fit weights from shards and write a weight file')
+    fit.add_argument('directory')
+    fit.add_argument('--method', choices=('lstsq', 'logistic'), default='lstsq')
+    fit.add_argument('--min-empties', type=int, default=0)
+    fit.add_argument('--max-empties', type=int, default=64)
+    fit.add_argument('--largest', type=int, default=100, help='integer the largest weight is scaled to')
+    fit.add_argument('--output', default=WEIGHTS_PATH,
+                     help='weights file (default: the one evaluation.py loads, next to it)')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    if args.command == 'selfplay':
+        selfPlay(args.records, args.games, args.level, args.random_plies, args.seed, args.workers)
+        print(f'{args.games} games in {time.perf_counter() - start:.1f}s')
+    elif args.command == 'shards':
+        total = writeShards(args.records, args.directory)
+        print(f'{total} positions in {time.perf_counter() - start:.1f}s')
+    else:
+        method = fitLeastSquares if args.method == 'lstsq' else fitLogistic
+        fitted, rows = method(args.directory, args.min_empties, args.max_empties)
+        try:
+            weights = engineWeights(fitted, args.largest)
+        except ValueError as error:
+            parser.error(f'{error}; nothing written')
+        saveWeights(args.output, weights, method=args.method, positions=rows,
+                    fitted={name: float(value) for name, value in fitted.items()})
+        print(f'{rows} positions in {time.perf_counter() - start:.1f}s: {weights}')